@@ -5,6 +5,7 @@ import os
 
 from app.core.database import Base
 import app.models
+from app.services.partition_service import is_partition
 
 
 from sqlalchemy import engine_from_config
@@ -35,6 +36,17 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata 
 
+
+def include_name(name, type_, parent_names):
+    # xp_events' monthly partitions are created and dropped by partition_service, not
+    # the models; left in, autogenerate would emit drop_table for every one of them.
+    # The partitioned xp_events keys on (id, created_at) while the model keeps id alone;
+    # autogenerate doesn't compare primary keys, so that difference never surfaces.
+    if type_ == "table":
+        return not is_partition(name)
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -57,6 +69,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_name=include_name,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -80,7 +93,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_name=include_name
         )
 
         with context.begin_transaction():
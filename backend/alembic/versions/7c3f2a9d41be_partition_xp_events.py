@@ -0,0 +1,130 @@
+"""partition xp_events by month
+
+Converts xp_events into a table range-partitioned on created_at with one
+partition per UTC month (xp_events_pYYYYMM) plus xp_events_default. Partitions for
+later months are created by scripts/archive_xp_events.py, which also archives
+old ones. Postgres only; skipped on other dialects or if already partitioned.
+
+This revision is its own branch because earlier schema revisions are generated
+per environment — apply it with `alembic upgrade heads` once xp_events exists.
+
+Revision ID: 7c3f2a9d41be
+Revises:
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7c3f2a9d41be"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = ("xp_partitioning",)
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+INDEXES = {
+    "ix_xp_events_user_id": "(user_id)",
+    "ix_xp_events_user_source_created": "(user_id, source, created_at)",
+    "ix_xp_events_user_created_id": "(user_id, created_at DESC, id DESC)",
+}
+
+
+def _add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _is_partitioned(conn) -> bool:
+    return conn.execute(sa.text(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('xp_events')"
+    )).scalar() is True
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != "postgresql" or _is_partitioned(conn):
+        return
+    if conn.execute(sa.text("SELECT to_regclass('xp_events')")).scalar() is None:
+        return
+
+    sequence = conn.execute(sa.text("SELECT pg_get_serial_sequence('xp_events', 'id')")).scalar()
+    oldest = conn.execute(sa.text("SELECT min(created_at) FROM xp_events")).scalar()
+
+    op.execute("ALTER TABLE xp_events RENAME TO xp_events_legacy")
+    op.execute("ALTER TABLE xp_events_legacy RENAME CONSTRAINT xp_events_pkey TO xp_events_legacy_pkey")
+    for name in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+
+    # The partition key has to be part of the primary key
+    op.execute(f"""
+        CREATE TABLE xp_events (
+            id INTEGER NOT NULL DEFAULT nextval('{sequence}'),
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            source VARCHAR(32) NOT NULL,
+            amount INTEGER NOT NULL,
+            meta JSON,
+            notified BOOLEAN NOT NULL DEFAULT false,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY xp_events.id")
+
+    this_month = datetime.now(timezone.utc).date().replace(day=1)
+    month = oldest.astimezone(timezone.utc).date().replace(day=1) if oldest else this_month
+    while month <= _add_months(this_month, MONTHS_AHEAD):
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE xp_events_p{month:%Y%m} PARTITION OF xp_events "
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{upper.isoformat()} 00:00:00+00')"
+        )
+        month = upper
+    op.execute("CREATE TABLE xp_events_default PARTITION OF xp_events DEFAULT")
+
+    for name, columns in INDEXES.items():
+        op.execute(f"CREATE INDEX {name} ON xp_events {columns}")
+
+    op.execute("""
+        INSERT INTO xp_events (id, user_id, source, amount, meta, notified, created_at)
+        SELECT id, user_id, source, amount, meta, notified, created_at FROM xp_events_legacy
+    """)
+    op.execute("DROP TABLE xp_events_legacy")
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != "postgresql" or not _is_partitioned(conn):
+        return
+
+    sequence = conn.execute(sa.text("SELECT pg_get_serial_sequence('xp_events', 'id')")).scalar()
+    op.execute("ALTER TABLE xp_events RENAME TO xp_events_partitioned")
+    op.execute("ALTER TABLE xp_events_partitioned RENAME CONSTRAINT xp_events_pkey TO xp_events_partitioned_pkey")
+    for name in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+
+    op.execute(f"""
+        CREATE TABLE xp_events (
+            id INTEGER NOT NULL DEFAULT nextval('{sequence}') PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            source VARCHAR(32) NOT NULL,
+            amount INTEGER NOT NULL,
+            meta JSON,
+            notified BOOLEAN NOT NULL DEFAULT false,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+    """)
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY xp_events.id")
+    op.execute("""
+        INSERT INTO xp_events (id, user_id, source, amount, meta, notified, created_at)
+        SELECT id, user_id, source, amount, meta, notified, created_at FROM xp_events_partitioned
+    """)
+    for name, columns in INDEXES.items():
+        op.execute(f"CREATE INDEX {name} ON xp_events {columns}")
+    op.execute("DROP TABLE xp_events_partitioned")
@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.routes import auth, events, github, goals, insights, leetcode, webhooks
+from app.api.routes import auth, events, github, goals, insights, leaderboard, leetcode, webhooks
 
 api_router = APIRouter(prefix="/api")
 
@@ -10,4 +10,5 @@ api_router.include_router(github.router)
 api_router.include_router(leetcode.router)
 api_router.include_router(goals.router)
 api_router.include_router(insights.router)
+api_router.include_router(leaderboard.router)
 api_router.include_router(webhooks.router)
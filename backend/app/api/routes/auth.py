@@ -18,6 +18,7 @@ from app.schemas.user import StreakInfo, UserOut, ProfileUpdate
 from app.services.xp_service import xp_for_level
 from app.services.cache import cache_get, cache_set, cache_delete
 from app.services.goal_service import ensure_daily_goals
+from app.services import leaderboard_service, login_cache
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 print("AUTH MODULE LOADED", flush=True)
@@ -90,6 +91,7 @@ async def github_callback(
     result = await db.execute(select(User).where(User.github_id == github_id))
     user = result.scalar_one_or_none()
 
+    previous_login = user.github_login if user else None
     if user:
         user.github_login = github_user["login"]
         user.email = github_user.get("email")
@@ -108,6 +110,8 @@ async def github_callback(
 
     await db.flush()
     await db.commit()
+    if previous_login != user.github_login:
+        await login_cache.invalidate(previous_login, user.github_login)
 
     jwt_token = create_access_token(user.id)
     # Set the JWT as a cookie so the token never appears in the URL
@@ -217,9 +221,12 @@ async def update_profile(
 @router.delete("/account", status_code=204)
 async def delete_account(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     cache_key = f"user:me:{user.id}"
+    user_id, github_login = user.id, user.github_login
     await db.delete(user)
     await db.commit()
     await cache_delete(cache_key)
+    await login_cache.invalidate(github_login)
+    await leaderboard_service.remove_user(user_id)
 
 
 @router.post("/logout")
@@ -247,6 +254,7 @@ async def dev_login(db: AsyncSession = Depends(get_db)):
         db.add(user)
         await db.flush()
         await db.commit()
+        await login_cache.invalidate(user.github_login)
 
     jwt_token = create_access_token(user.id)
     response = RedirectResponse(f"{settings.FRONTEND_URL}/auth/callback")
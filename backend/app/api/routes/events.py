@@ -1,32 +1,38 @@
 import asyncio
-import json
+import base64
+import logging
+from datetime import datetime, timedelta, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from typing import Literal
+
+import msgspec
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
 from fastapi.responses import StreamingResponse
+from fastapi.websockets import WebSocketState
 from jose import JWTError, jwt
-from sqlalchemy import select, update
+from sqlalchemy import select, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.core.database import get_db
 from app.core.security import get_current_user
 from app.models.user import User
-from app.models.xp_event import XPEvent
-from app.schemas.xp_event import XPEventOut
-from app.services import sse_service
+from app.models.xp_event import XPEvent, XPSource
+from app.schemas.xp_event import SocketMessage, XPDailyOut, XPEventOut, XPHistoryPage
+from app.services import commit_files_service, rollup_service, sse_service
 from app.services.sse_service import connect, disconnect
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/events", tags=["events"])
 
-KEEPALIVE_SECONDS = 25
+MAX_ACKS_PER_MESSAGE = 500
 
+_socket_decoder = msgspec.json.Decoder(SocketMessage)
+_socket_msgpack_decoder = msgspec.msgpack.Decoder(SocketMessage)
 
-async def _user_from_token(
-    request: Request,
-    db: AsyncSession = Depends(get_db),
-) -> User:
-    """JWT auth via cookie — EventSource sends cookies automatically."""
-    token = request.cookies.get("auth_token")
+
+async def _user_from_cookie(token: str | None, db: AsyncSession) -> User:
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
     try:
@@ -42,22 +48,35 @@ async def _user_from_token(
     return user
 
 
+async def _user_from_token(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+) -> User:
+    """JWT auth via cookie — EventSource sends cookies automatically."""
+    return await _user_from_cookie(request.cookies.get("auth_token"), db)
+
+
 @router.get("/stream")
-async def event_stream(current_user: User = Depends(_user_from_token)):
-    q = connect(current_user.id)
+async def event_stream(request: Request, current_user: User = Depends(_user_from_token)):
+    try:
+        q = await connect(current_user.id)
+    except sse_service.ConnectionLimitError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many open event streams",
+            headers={"Retry-After": str(settings.SSE_RETRY_AFTER_SECONDS)},
+        )
+    last_event_id = request.headers.get("last-event-id")
 
     async def generate():
         try:
-            yield "event: connected\ndata: {}\n\n"
-            while True:
-                try:
-                    event = await asyncio.wait_for(q.get(), timeout=KEEPALIVE_SECONDS)
-                    payload = json.dumps(event["data"])
-                    yield f"event: {event['type']}\ndata: {payload}\n\n"
-                except asyncio.TimeoutError:
-                    yield ": keepalive\n\n"
+            yield b"event: connected\ndata: {}\n\n"
+            # EventSource sends the last id it saw when it reconnects. Keepalives are
+            # queued by sse_service's shared heartbeat; frames arrive pre-encoded.
+            async for event in sse_service.follow(current_user.id, q, last_event_id):
+                yield event.frame
         finally:
-            disconnect(current_user.id, q)
+            await disconnect(current_user.id, q)
 
     return StreamingResponse(
         generate(),
@@ -70,20 +89,194 @@ async def event_stream(current_user: User = Depends(_user_from_token)):
     )
 
 
+def _unread_since() -> datetime:
+    # Bounding created_at lets Postgres prune xp_events down to the recent partitions
+    return datetime.now(timezone.utc) - timedelta(days=settings.XP_UNREAD_WINDOW_DAYS)
+
+
+async def _mark_notified(db: AsyncSession, user_id: int, event_ids: list[int]) -> None:
+    await db.execute(
+        update(XPEvent)
+        .where(
+            XPEvent.user_id == user_id,
+            XPEvent.id.in_(event_ids),
+            XPEvent.created_at >= _unread_since(),
+        )
+        .values(notified=True)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+
+@router.websocket("/ws")
+async def event_socket(
+    websocket: WebSocket,
+    format: Literal["json", "msgpack"] = "json",
+    last_event_id: str | None = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    The /stream events over a WebSocket, meant to be opened once per browser and
+    shared by its tabs (e.g. from a SharedWorker). Frames are {"id", "t", "d"} as
+    compact JSON text or, with ?format=msgpack, msgpack binary.
+
+    Clients acknowledge xp_gained events by sending {"ack": [event_ids]}, which marks
+    those XP events notified. Unlike SSE, delivery alone doesn't count as read.
+    """
+    try:
+        user = await _user_from_cookie(websocket.cookies.get("auth_token"), db)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await db.close()  # don't hold a pooled connection for the socket's lifetime
+    try:
+        q = await connect(user.id, acks=True)
+    except sse_service.ConnectionLimitError:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+
+    async def send_events():
+        async for event in sse_service.follow(user.id, q, last_event_id):
+            if event is sse_service.KEEPALIVE:  # the server's WebSocket pings keep the socket alive
+                continue
+            if format == "msgpack":
+                await websocket.send_bytes(event.socket_frame(format))
+            else:
+                await websocket.send_text(event.socket_frame(format))
+
+    async def receive_acks():
+        decoder = _socket_msgpack_decoder if format == "msgpack" else _socket_decoder
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            raw = message.get("bytes") if format == "msgpack" else message.get("text") or message.get("bytes")
+            try:
+                ack = decoder.decode(raw).ack if raw else None
+            except msgspec.DecodeError:
+                logger.debug("Ignoring malformed WebSocket message from user %s", user.id)
+                continue
+            if ack:
+                await _mark_notified(db, user.id, ack[:MAX_ACKS_PER_MESSAGE])
+
+    await websocket.accept()
+    tasks = [asyncio.create_task(send_events()), asyncio.create_task(receive_acks())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            exc = task.exception()
+            if exc is not None and not isinstance(exc, WebSocketDisconnect):
+                raise exc
+    finally:
+        for task in tasks:
+            task.cancel()
+        await disconnect(user.id, q)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if websocket.client_state == WebSocketState.CONNECTED:
+            await websocket.close()
+
+
 @router.get("/unread", response_model=list[XPEventOut])
 async def get_unread_events(
+    limit: int = Query(100, ge=1, le=500),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """Return XP events that were earned while the user was offline."""
+    """Return XP events that were earned while the user was offline (oldest first, at most `limit`)."""
     result = await db.execute(
         select(XPEvent)
-        .where(XPEvent.user_id == current_user.id, XPEvent.notified == False)  # noqa: E712
+        .where(
+            XPEvent.user_id == current_user.id,
+            XPEvent.notified == False,  # noqa: E712
+            XPEvent.created_at >= _unread_since(),
+        )
         .order_by(XPEvent.created_at.asc())
+        .limit(limit)
     )
     return result.scalars().all()
 
 
+def _encode_cursor(created_at: datetime, event_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{event_id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, event_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(event_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/history", response_model=XPHistoryPage, response_model_exclude_unset=True)
+async def get_event_history(
+    cursor: str | None = None,
+    limit: int = Query(50, ge=1, le=200),
+    source: XPSource | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    include_meta: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Page through the user's XP events, newest first. Pages are keyed on (created_at, id)
+    so each one is an index range scan regardless of how deep into history it is.
+    """
+    columns = [XPEvent.id, XPEvent.source, XPEvent.amount, XPEvent.created_at]
+    if include_meta:
+        columns.append(XPEvent.meta)
+    query = select(*columns).where(XPEvent.user_id == current_user.id)
+    if source is not None:
+        query = query.where(XPEvent.source == source)
+    if since is not None:
+        query = query.where(XPEvent.created_at >= since)
+    if until is not None:
+        query = query.where(XPEvent.created_at < until)
+    if cursor is not None:
+        query = query.where(tuple_(XPEvent.created_at, XPEvent.id) < _decode_cursor(cursor))
+
+    result = await db.execute(query.order_by(XPEvent.created_at.desc(), XPEvent.id.desc()).limit(limit + 1))
+    rows = result.mappings().all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+    return XPHistoryPage(items=[dict(row) for row in rows], next_cursor=next_cursor)
+
+
+@router.get("/daily", response_model=list[XPDailyOut])
+async def get_daily_xp(
+    days: int = Query(30, ge=1, le=366),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Per-day, per-source XP totals for the last `days` days, read from the rollup table."""
+    since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+    return await rollup_service.daily_totals(db, current_user.id, since)
+
+
+@router.get("/{event_id}/files")
+async def get_event_files(
+    event_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Added/removed/modified file lists of a commit XP event, loaded on demand."""
+    result = await db.execute(
+        select(XPEvent.meta).where(
+            XPEvent.id == event_id,
+            XPEvent.user_id == current_user.id,
+            XPEvent.source == XPSource.COMMIT,
+        )
+    )
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    return await commit_files_service.load(db, row.meta)
+
+
 @router.post("/mark-read", status_code=204)
 async def mark_events_read(
     current_user: User = Depends(get_current_user),
@@ -92,7 +285,11 @@ async def mark_events_read(
     """Mark all unread XP events as notified."""
     await db.execute(
         update(XPEvent)
-        .where(XPEvent.user_id == current_user.id, XPEvent.notified == False)  # noqa: E712
+        .where(
+            XPEvent.user_id == current_user.id,
+            XPEvent.notified == False,  # noqa: E712
+            XPEvent.created_at >= _unread_since(),
+        )
         .values(notified=True)
     )
     await db.commit()
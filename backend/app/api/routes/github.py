@@ -3,12 +3,16 @@ from fastapi import APIRouter, Depends, HTTPException
 
 from app.core.security import get_current_user
 from app.models.user import User
-from app.services.cache import cache_get, cache_set
-from app.services.github_service import fetch_branches, fetch_commit_detail, fetch_commits, fetch_events, fetch_repos
+from app.services.cache import get_or_compute
+from app.services.github_service import (
+    cache_key, fetch_branches, fetch_commit_detail, fetch_commits, fetch_events, fetch_repos, repo_tag,
+)
 
 router = APIRouter(prefix="/github", tags=["github"])
 
 REPOS_TTL = 60 * 5  # 5 minutes
+# Past REPOS_TTL the cached value is still served for this long while it refreshes in the background
+STALE_TTL = 60 * 60
 
 
 @router.get("/repos")
@@ -16,50 +20,58 @@ async def get_repos(user: User = Depends(get_current_user)):
     if not user.github_access_token:
         raise HTTPException(status_code=400, detail="No GitHub token on file")
 
-    cache_key = f"github:repos:{user.id}"
-    cached = await cache_get(cache_key)
-    if cached:
-        return cached
+    token = user.github_access_token  # loaders may run after the request's session is gone
+
+    async def load():
+        raw = await fetch_repos(token)
+        return [
+            {
+                "id": r["id"],
+                "name": r["name"],
+                "full_name": r["full_name"],
+                "description": r.get("description"),
+                "url": r["html_url"],
+                "language": r.get("language"),
+                "stars": r["stargazers_count"],
+                "forks": r["forks_count"],
+                "pushed_at": r.get("pushed_at"),
+                "private": r["private"],
+            }
+            for r in raw
+        ]
 
     try:
-        raw = await fetch_repos(user.github_access_token)
+        return await get_or_compute(cache_key("repos", user.id), REPOS_TTL, load, stale_ttl=STALE_TTL)
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="GitHub token expired — please log in again")
         raise HTTPException(status_code=502, detail="GitHub API error")
 
-    repos = [
-        {
-            "id": r["id"],
-            "name": r["name"],
-            "full_name": r["full_name"],
-            "description": r.get("description"),
-            "url": r["html_url"],
-            "language": r.get("language"),
-            "stars": r["stargazers_count"],
-            "forks": r["forks_count"],
-            "pushed_at": r.get("pushed_at"),
-            "private": r["private"],
-        }
-        for r in raw
-    ]
-
-    await cache_set(cache_key, repos, ttl=REPOS_TTL)
-    return repos
-
 
 @router.get("/repos/{repo_name}/commits")
 async def get_repo_commits(repo_name: str, user: User = Depends(get_current_user)):
     if not user.github_access_token:
         raise HTTPException(status_code=400, detail="No GitHub token on file")
 
-    cache_key = f"github:commits:{user.id}:{repo_name}"
-    cached = await cache_get(cache_key)
-    if cached:
-        return cached
+    token, login = user.github_access_token, user.github_login
+
+    async def load():
+        raw = await fetch_commits(token, login, repo_name)
+        return [
+            {
+                "sha": c["sha"],
+                "message": c["commit"]["message"].splitlines()[0],
+                "date": c["commit"]["author"]["date"],
+                "author": c["commit"]["author"]["name"],
+            }
+            for c in raw
+        ]
 
     try:
-        raw = await fetch_commits(user.github_access_token, user.github_login, repo_name)
+        return await get_or_compute(
+            cache_key("commits", user.id, repo_name), REPOS_TTL, load,
+            stale_ttl=STALE_TTL, tags=[repo_tag(f"{login}/{repo_name}")],
+        )
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="GitHub token expired — please log in again")
@@ -67,115 +79,96 @@ async def get_repo_commits(repo_name: str, user: User = Depends(get_current_user
             raise HTTPException(status_code=404, detail="Repo not found")
         raise HTTPException(status_code=502, detail="GitHub API error")
 
-    commits = [
-        {
-            "sha": c["sha"],
-            "message": c["commit"]["message"].splitlines()[0],
-            "date": c["commit"]["author"]["date"],
-            "author": c["commit"]["author"]["name"],
-        }
-        for c in raw
-    ]
-
-    await cache_set(cache_key, commits, ttl=REPOS_TTL)
-    return commits
-
 
 @router.get("/repos/{repo_name}/branches")
 async def get_repo_branches(repo_name: str, user: User = Depends(get_current_user)):
     if not user.github_access_token:
         raise HTTPException(status_code=400, detail="No GitHub token on file")
 
-    cache_key = f"github:branches:{user.id}:{repo_name}"
-    cached = await cache_get(cache_key)
-    if cached:
-        return cached
+    token, login = user.github_access_token, user.github_login
+
+    async def load():
+        return await fetch_branches(token, login, repo_name)
 
     try:
-        branches = await fetch_branches(user.github_access_token, user.github_login, repo_name)
+        return await get_or_compute(
+            cache_key("branches", user.id, repo_name), REPOS_TTL, load,
+            stale_ttl=STALE_TTL, tags=[repo_tag(f"{login}/{repo_name}")],
+        )
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="GitHub token expired — please log in again")
         raise HTTPException(status_code=502, detail="GitHub API error")
 
-    await cache_set(cache_key, branches, ttl=REPOS_TTL)
-    return branches
-
 
 @router.get("/repos/{repo_name}/commits/{sha}")
 async def get_commit_detail(repo_name: str, sha: str, user: User = Depends(get_current_user)):
     if not user.github_access_token:
         raise HTTPException(status_code=400, detail="No GitHub token on file")
 
-    cache_key = f"github:repo:{user.github_login}/{repo_name}:commit:{sha}:{user.id}"
-    cached = await cache_get(cache_key)
-    if cached:
-        return cached
+    token, login = user.github_access_token, user.github_login
+
+    async def load():
+        raw = await fetch_commit_detail(token, login, repo_name, sha)
+        stats = raw.get("stats", {})
+        return {
+            "sha": raw["sha"],
+            "message": raw["commit"]["message"],
+            "date": raw["commit"]["author"]["date"],
+            "author": raw["commit"]["author"]["name"],
+            "additions": stats.get("additions", 0),
+            "deletions": stats.get("deletions", 0),
+            "files": [
+                {
+                    "filename": f["filename"],
+                    "additions": f["additions"],
+                    "deletions": f["deletions"],
+                    "status": f["status"],
+                }
+                for f in raw.get("files", [])[:10]
+            ],
+        }
 
+    cache_key = f"github:repo:{login}/{repo_name}:commit:{sha}:{user.id}"
     try:
-        raw = await fetch_commit_detail(user.github_access_token, user.github_login, repo_name, sha)
+        return await get_or_compute(cache_key, REPOS_TTL, load, tags=[repo_tag(f"{login}/{repo_name}")])
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="GitHub token expired — please log in again")
         raise HTTPException(status_code=502, detail="GitHub API error")
 
-    stats = raw.get("stats", {})
-    result = {
-        "sha": raw["sha"],
-        "message": raw["commit"]["message"],
-        "date": raw["commit"]["author"]["date"],
-        "author": raw["commit"]["author"]["name"],
-        "additions": stats.get("additions", 0),
-        "deletions": stats.get("deletions", 0),
-        "files": [
-            {
-                "filename": f["filename"],
-                "additions": f["additions"],
-                "deletions": f["deletions"],
-                "status": f["status"],
-            }
-            for f in raw.get("files", [])[:10]
-        ],
-    }
-
-    await cache_set(cache_key, result, ttl=REPOS_TTL)
-    return result
-
 
 @router.get("/activity")
 async def get_activity(user: User = Depends(get_current_user)):
     if not user.github_access_token:
         raise HTTPException(status_code=400, detail="No GitHub token on file")
 
-    cache_key = f"github:activity:{user.id}"
-    cached = await cache_get(cache_key)
-    if cached:
-        return cached
+    token, login = user.github_access_token, user.github_login
+
+    async def load():
+        events = await fetch_events(login, token)
+        pushes = []
+        for event in events:
+            if event.get("type") != "PushEvent":
+                continue
+            payload = event.get("payload", {})
+            commits = [
+                {"message": c["message"].splitlines()[0], "sha": c.get("sha", c.get("id", ""))[:7]}
+                for c in payload.get("commits", [])
+            ]
+            pushes.append({
+                "repo": event["repo"]["name"],
+                "commits": commits,
+                "count": payload.get("size", len(commits)),
+                "date": event["created_at"],
+            })
+            if len(pushes) >= 10:
+                break
+        return pushes
 
     try:
-        events = await fetch_events(user.github_login, user.github_access_token)
+        return await get_or_compute(cache_key("activity", user.id), 60 * 5, load, stale_ttl=STALE_TTL)
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="GitHub token expired — please log in again")
         raise HTTPException(status_code=502, detail="GitHub API error")
-
-    pushes = []
-    for event in events:
-        if event.get("type") != "PushEvent":
-            continue
-        payload = event.get("payload", {})
-        commits = [
-            {"message": c["message"].splitlines()[0], "sha": c.get("sha", c.get("id", ""))[:7]}
-            for c in payload.get("commits", [])
-        ]
-        pushes.append({
-            "repo": event["repo"]["name"],
-            "commits": commits,
-            "count": payload.get("size", len(commits)),
-            "date": event["created_at"],
-        })
-        if len(pushes) >= 10:
-            break
-
-    await cache_set(cache_key, pushes, ttl=60 * 5)
-    return pushes
@@ -0,0 +1,57 @@
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import get_db
+from app.core.security import get_current_user
+from app.models.user import User
+from app.schemas.leaderboard import LeaderboardEntry, LeaderboardRank
+from app.services import leaderboard_service
+
+router = APIRouter(prefix="/leaderboard", tags=["leaderboard"])
+
+
+def _validate_board(board: str) -> str:
+    if board not in leaderboard_service.BOARDS:
+        raise HTTPException(status_code=404, detail="Unknown leaderboard")
+    return board
+
+
+async def _with_profiles(db: AsyncSession, entries: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Attach usernames/avatars in one query; members whose account is gone are dropped."""
+    if not entries:
+        return []
+    result = await db.execute(
+        select(User.id, User.username, User.avatar_url).where(User.id.in_([e["user_id"] for e in entries]))
+    )
+    profiles = {row.id: row for row in result.all()}
+    return [
+        {**e, "username": profiles[e["user_id"]].username, "avatar_url": profiles[e["user_id"]].avatar_url}
+        for e in entries
+        if e["user_id"] in profiles
+    ]
+
+
+@router.get("/{board}", response_model=list[LeaderboardEntry])
+async def get_leaderboard(
+    board: str = Depends(_validate_board),
+    limit: int = Query(10, ge=1, le=100),
+    _user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Top-N users on a board: `all`, `week` or an XP source such as `commit`."""
+    return await _with_profiles(db, await leaderboard_service.top(board, limit))
+
+
+@router.get("/{board}/me", response_model=LeaderboardRank)
+async def get_my_rank(
+    board: str = Depends(_validate_board),
+    radius: int = Query(2, ge=0, le=25),
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """The current user's rank on a board plus the `radius` users above and below them."""
+    rank, xp, neighbours = await leaderboard_service.rank(board, user.id, radius)
+    return {"rank": rank, "xp": xp, "neighbours": await _with_profiles(db, neighbours)}
@@ -9,7 +9,7 @@ from app.models.leetcode import LeetCodeSolve, LeetCodeProblem
 from app.models.user import User
 from app.schemas.leetcode import LeetCodeSolveCreate, LeetCodeSolveOut, LCImportRequest
 from app.services.cache import cache_delete
-from app.services.sse_service import connect, disconnect, push
+from app.services.sse_service import push
 from app.schemas.leetcode import LeetCodeSolveUpdate
 from app.services.leetcode_service import update_solve, delete_solve, get_stats, log_solve, get_solve, search_problems, import_historical_solves, validate_leetcode_username
 from app.services.goal_service import increment_leetcode_goals
@@ -3,32 +3,39 @@ import hmac
 from collections.abc import Awaitable, Callable
 from typing import Any
 
+import msgspec
 from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import JSONResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import AsyncSessionLocal, get_db
 from app.models.streak import StreakType
 from app.models.user import User
 from app.models.xp_event import XPSource
-from app.services.cache import cache_delete, cache_delete_pattern
+from app.services.cache import cache_delete, invalidate_tag
+from app.services.github_service import cache_key, repo_tag
 from app.services.streak_service import update_streak
-from app.services.xp_service import award_xp
+from app.services.xp_service import award_xp, award_xp_batch
 from app.services.goal_service import increment_commit_goals
-from app.services import sse_service
+from app.services import commit_files_service, delivery_store, login_cache, sse_service, webhook_queue
 from app.schemas.goal import GoalOut
+from app.schemas.webhook import PushEvent, WebhookPayload
 
 router = APIRouter(prefix="/webhooks", tags=["webhooks"])
 
-# Registry: event type -> handler(data, db, user) -> result dict
-EventHandler = Callable[[dict, AsyncSession, User], Awaitable[dict[str, Any]]]
+# Registry: event type -> handler(payload, db, user) -> result dict
+EventHandler = Callable[[Any, AsyncSession, User], Awaitable[dict[str, Any]]]
 _handlers: dict[str, EventHandler] = {}
+# event type -> decoder for the event's typed payload
+_decoders: dict[str, msgspec.json.Decoder] = {}
 
 
-def github_event(event_type: str):
+def github_event(event_type: str, payload: type[WebhookPayload] = WebhookPayload):
     def decorator(fn: EventHandler) -> EventHandler:
         _handlers[event_type] = fn
+        _decoders[event_type] = msgspec.json.Decoder(payload)
         return fn
     return decorator
 
@@ -46,40 +53,42 @@ def _verify_signature(body: bytes, signature_header: str | None) -> bool:
 
 
 async def _resolve_user(db: AsyncSession, username: str) -> User | None:
+    user_id = await login_cache.lookup(username)
+    if user_id == login_cache.UNKNOWN:
+        return None  # not a Shepherd user — rejected without a query
+    if user_id is not None:
+        user = await db.get(User, user_id)
+        if user is not None and user.github_login == username:
+            return user
+
     result = await db.execute(select(User).where(User.github_login == username))
-    return result.scalar_one_or_none()
+    user = result.scalar_one_or_none()
+    await login_cache.store(username, user.id if user else None)
+    return user
 
 
 
 # @github_event("push") calls github_event("push"), which returns decorator.
 # Python then calls decorator(handle_push), registering _handlers["push"] = handle_push.
-@github_event("push")
-async def handle_push(data: dict, db: AsyncSession, user: User) -> dict[str, Any]:
-    commits = data.get("commits", [])
-    repo = data.get("repository", {}).get("full_name", "")
-
-    try: 
-        for commit in commits:
-            added_files = commit.get("added", [])
-            removed_files = commit.get("removed", [])
-            modified_files = commit.get("modified", [])
-
-            meta = {
-                "sha": commit.get("id"),
+@github_event("push", payload=PushEvent)
+async def handle_push(data: PushEvent, db: AsyncSession, user: User) -> dict[str, Any]:
+    commits = data.commits
+    repo = data.repository.full_name
+
+    try:
+        # File lists go to the compressed side table; the event only keeps a reference
+        file_refs = await commit_files_service.store(db, [(c.added, c.removed, c.modified) for c in commits])
+        items = [
+            (XPSource.COMMIT, {
+                "sha": commit.id,
                 "repo": repo,
-                "added_files": added_files,
-                "removed_files": removed_files,
-                "modified_files": modified_files,
-                "files_changed": len(added_files) + len(removed_files) + len(modified_files),
-            }
+                "files_changed": commit.files_changed,
+                "files_ref": ref,
+            })
+            for commit, ref in zip(commits, file_refs)
+        ]
 
-            
-            await award_xp(
-                db,
-                user,
-                XPSource.COMMIT,
-                meta=meta, 
-            )
+        await award_xp_batch(db, user, items, meta={"repo": repo, "commits": len(items)})
         await update_streak(db, user, StreakType.GITHUB)
         updated_goals = await increment_commit_goals(user, db)
         for goal in updated_goals:
@@ -90,8 +99,8 @@ async def handle_push(data: dict, db: AsyncSession, user: User) -> dict[str, Any
             await db.refresh(goal)
             await sse_service.push(user.id, "goal_updated", GoalOut.model_validate(goal).model_dump(mode="json"))
         await cache_delete(f"user:me:{user.id}")
-        await cache_delete(f"github:repos:{user.id}")
-        await cache_delete_pattern(f"github:repo:{repo}:*")
+        await cache_delete(cache_key("repos", user.id))
+        await invalidate_tag(repo_tag(repo))
     except Exception:
         await db.rollback()
         raise
@@ -99,30 +108,84 @@ async def handle_push(data: dict, db: AsyncSession, user: User) -> dict[str, Any
 
     return {"status": "ok", "commits_processed": len(commits)}
 
+def decode_payload(event_type: str, body: bytes | str) -> WebhookPayload:
+    """Parse the raw body straight into the event's payload type — the only JSON parse per delivery."""
+    return _decoders[event_type].decode(body)
+
+
+async def process_delivery(
+    event_type: str | None,
+    delivery_id: str | None,
+    body: bytes | str,
+    db: AsyncSession,
+) -> dict[str, Any]:
+    handler = _handlers.get(event_type)
+    if handler is None:
+        return {"status": "ignored", "event": event_type}
+
+    # Redeliveries are answered with the result of the first processing, before any parsing
+    if delivery_id:
+        previous = await delivery_store.get(db, delivery_id)
+        if previous is not None:
+            return previous
+
+    try:
+        data = decode_payload(event_type, body)
+    except msgspec.DecodeError:
+        return {"status": "invalid payload"}
+
+    pusher_name = data.actor_login
+    if not pusher_name:
+        return {"status": "no sender"}
+
+    user = await _resolve_user(db, pusher_name)
+    if user is None:
+        return {"status": "user not found"}
+
+    if not delivery_id:
+        return await handler(data, db, user)
+
+    # A concurrent delivery of the same id may have claimed it since the check above
+    previous = await delivery_store.claim(db, delivery_id, event_type)
+    if previous is not None:
+        return previous
+    try:
+        result = await handler(data, db, user)
+    except Exception:
+        await delivery_store.release(delivery_id)
+        raise
+    await delivery_store.record(db, delivery_id, result)
+    return result
+
+
+async def process_queued_delivery(event_type: str, delivery_id: str, body: str) -> dict[str, Any]:
+    """Worker entry point — runs a delivery taken off the webhook stream in its own session."""
+    async with AsyncSessionLocal() as db:
+        result = await process_delivery(event_type, delivery_id, body, db)
+        await db.commit()
+        return result
+
+
 @router.post("/github")
 async def github_webhook(
     request: Request,
     db: AsyncSession = Depends(get_db),
     x_hub_signature_256: str | None = Header(default=None),
     x_github_event: str | None = Header(default=None),
+    x_github_delivery: str | None = Header(default=None),
 ):
     body = await request.body()
 
     if not _verify_signature(body, x_hub_signature_256):
         raise HTTPException(status_code=401, detail="Invalid signature")
 
-    data = await request.json()
-
-    handler = _handlers.get(x_github_event)
-    if handler is None:
-        return {"status": "ignored", "event": x_github_event}
-
-    pusher_name = data.get("pusher", {}).get("name") or data.get("sender", {}).get("login")
-    if not pusher_name:
-        return {"status": "no sender"}
-
-    user = await _resolve_user(db, pusher_name)
-    if user is None:
-        return {"status": "user not found"}
+    if settings.WEBHOOK_QUEUE_ENABLED and x_github_event in _handlers:
+        if x_github_delivery:
+            previous = await delivery_store.get(db, x_github_delivery)
+            if previous is not None:
+                return previous
+        stream_id = await webhook_queue.enqueue(x_github_event, x_github_delivery or "", body)
+        if stream_id is not None:
+            return JSONResponse(status_code=202, content={"status": "queued", "id": stream_id})
 
-    return await handler(data, db, user)
+    return await process_delivery(x_github_event, x_github_delivery, body, db)
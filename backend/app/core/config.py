@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -10,6 +12,16 @@ class Settings(BaseSettings):
 
     DATABASE_URL: str
     REDIS_URL: str = "redis://localhost:6379"
+    # In-process L1 in front of the Redis cache (0 entries disables it)
+    CACHE_LOCAL_MAX_ENTRIES: int = 5_000
+    CACHE_LOCAL_TTL: int = 30
+    # How cached values are stored. The defaults write bare JSON, which releases that
+    # predate codecs can still read. Any compressed or msgpack value carries a binary
+    # header those releases can't decode, so only switch to "msgpack" and/or a threshold
+    # (e.g. 1024) once no older pod is running. Reads accept every format regardless of
+    # these settings.
+    CACHE_CODEC: Literal["json", "msgpack"] = "json"
+    CACHE_COMPRESS_MIN_BYTES: int = 0
 
     GITHUB_CLIENT_ID: str = ""
     GITHUB_CLIENT_SECRET: str = ""
@@ -24,6 +36,38 @@ class Settings(BaseSettings):
     GITHUB_WEBHOOK_SECRET: str = ""
     LEETCODE_SESSION_COOKIE: str = ""
 
+    # Webhook ingestion — when enabled, deliveries are queued on a Redis Stream
+    # and processed by a worker pool instead of inside the request
+    WEBHOOK_QUEUE_ENABLED: bool = False
+    WEBHOOK_WORKERS: int = 4
+    WEBHOOK_MAX_ATTEMPTS: int = 5
+    WEBHOOK_STREAM_MAXLEN: int = 100_000
+    WEBHOOK_DELIVERY_TTL: int = 60 * 60 * 72  # GitHub allows redelivery for 3 days
+
+    # xp_events partitions older than this are archived to gzipped NDJSON (Postgres only)
+    XP_ARCHIVE_HORIZON_MONTHS: int = 12
+    XP_ARCHIVE_DIR: str = "archive/xp_events"
+    XP_UNREAD_WINDOW_DAYS: int = 30  # keeps unread lookups on recent partitions
+
+    # Per-connection SSE buffer; a slow client past this triggers SSE_OVERFLOW_POLICY
+    # (drop_oldest, coalesce or disconnect)
+    SSE_QUEUE_SIZE: int = 64
+    SSE_OVERFLOW_POLICY: Literal["drop_oldest", "coalesce", "disconnect"] = "coalesce"
+    # Per-user replay buffer for reconnects with Last-Event-ID (needs Redis)
+    SSE_REPLAY_MAXLEN: int = 200
+    SSE_REPLAY_SECONDS: int = 60 * 60
+    # Connection limits (refused with 503 + Retry-After) and idle stream reaping (0 disables).
+    # Limits are counted per process, not cluster-wide. The frontend opens a stream per
+    # dashboard tab plus one on the goals page, and EventSource gives up for good on a
+    # non-200, so the per-user limit only needs to stop runaway clients.
+    SSE_MAX_CONNECTIONS_PER_USER: int = 50
+    SSE_MAX_CONNECTIONS: int = 20_000
+    SSE_RETRY_AFTER_SECONDS: int = 30
+    SSE_IDLE_SECONDS: int = 60 * 60 * 2
+    # Hold these event types briefly and merge bursts into one frame per user (0 disables)
+    SSE_COALESCE_WINDOW_MS: int = 0
+    SSE_COALESCE_TYPES: list[str] = ["xp_gained", "goal_updated"]
+
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 days
     FRONTEND_URL: str = "http://localhost:3000"
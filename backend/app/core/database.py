@@ -1,8 +1,14 @@
+import logging
+from collections.abc import Awaitable, Callable
+
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 _is_sqlite = settings.DATABASE_URL.startswith("sqlite")
 
 engine = create_async_engine(
@@ -11,9 +17,66 @@ engine = create_async_engine(
     **({} if _is_sqlite else {"pool_pre_ping": True}),
 )
 
+_AFTER_COMMIT = "after_commit"
+_AFTER_ROLLBACK = "after_rollback"
+
+
+class AppSession(AsyncSession):
+    """
+    AsyncSession that runs the callbacks registered with after_commit once a commit
+    succeeds, and those registered with after_rollback when the transaction is rolled
+    back or the session closes without committing it.
+    """
+
+    async def commit(self) -> None:
+        await super().commit()
+        self.info.pop(_AFTER_ROLLBACK, None)
+        await self._run(self.info.pop(_AFTER_COMMIT, []))
+
+    async def rollback(self) -> None:
+        self.info.pop(_AFTER_COMMIT, None)
+        await super().rollback()
+        await self._run(self.info.pop(_AFTER_ROLLBACK, []))
+
+    async def close(self) -> None:
+        self.info.pop(_AFTER_COMMIT, None)
+        callbacks = self.info.pop(_AFTER_ROLLBACK, [])  # closing discards uncommitted work
+        await super().close()
+        await self._run(callbacks)
+
+    async def _run(self, callbacks: list[Callable[[], Awaitable[None]]]) -> None:
+        for callback in callbacks:
+            try:
+                await callback()
+            except Exception:
+                # The commit or rollback stands; a failed callback only loses its own side effect
+                logger.exception("Transaction callback %r failed", callback)
+                if self.in_transaction():
+                    await super().rollback()
+
+
+def _register(db: AsyncSession, hook: str, callback: Callable[[], Awaitable[None]]) -> None:
+    if not isinstance(db, AppSession):
+        raise TypeError(f"{hook} needs a session from AsyncSessionLocal (AppSession)")
+    db.info.setdefault(hook, []).append(callback)
+
+
+def after_commit(db: AsyncSession, callback: Callable[[], Awaitable[None]]) -> None:
+    """
+    Run `callback` after the session's current transaction commits, for side effects other
+    sessions or processes must not see before the rows they refer to. Dropped on rollback.
+    """
+    _register(db, _AFTER_COMMIT, callback)
+
+
+def after_rollback(db: AsyncSession, callback: Callable[[], Awaitable[None]]) -> None:
+    """Run `callback` if the session's current transaction is discarded, to undo side effects taken ahead of it."""
+    _register(db, _AFTER_ROLLBACK, callback)
+
+
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
-    class_=AsyncSession,
+    class_=AppSession,
     expire_on_commit=False,
 )
 
@@ -22,6 +85,12 @@ class Base(DeclarativeBase):
     pass
 
 
+def dialect_insert(db: AsyncSession, model):
+    """INSERT for the session's dialect, which supports on_conflict_do_update/do_nothing."""
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(model)
+
+
 async def create_tables() -> None:
     """Create all tables if they don't exist. Used for SQLite local dev."""
     async with engine.begin() as conn:
@@ -1,7 +1,11 @@
 from app.models.user import User
 from app.models.job import Job
 from app.models.goal import Goal
+from app.models.leetcode import LeetCodeProblem, LeetCodeSolve
 from app.models.streak import Streak
 from app.models.xp_event import XPEvent
+from app.models.xp_rollup import XPDailyRollup
+from app.models.webhook_delivery import WebhookDelivery
+from app.models.commit_files import CommitFileList
 
-__all__ = ["User", "Job", "Goal", "Streak", "XPEvent"]
+__all__ = ["User", "Job", "Goal", "LeetCodeProblem", "LeetCodeSolve", "Streak", "XPEvent", "XPDailyRollup", "WebhookDelivery", "CommitFileList"]
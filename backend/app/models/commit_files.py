@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, LargeBinary, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class CommitFileList(Base):
+    """zlib-compressed added/removed/modified lists of a commit, shared by every commit with the same lists."""
+
+    __tablename__ = "commit_file_lists"
+
+    hash: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256 of the uncompressed JSON
+    data: Mapped[bytes] = mapped_column(LargeBinary)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
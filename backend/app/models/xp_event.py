@@ -4,7 +4,7 @@ from datetime import datetime
 from enum import Enum
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, String, JSON, func
+from sqlalchemy import Boolean, DateTime, ForeignKey, Index, Integer, String, JSON, desc, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
@@ -22,6 +22,11 @@ class XPSource(str, Enum):
 
 class XPEvent(Base):
     __tablename__ = "xp_events"
+    __table_args__ = (
+        Index("ix_xp_events_user_source_created", "user_id", "source", "created_at"),
+        # Keyset pagination for /events/history walks (created_at, id) newest-first per user
+        Index("ix_xp_events_user_created_id", "user_id", desc("created_at"), desc("id")),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
@@ -32,3 +37,4 @@ class XPEvent(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     user: Mapped[User] = relationship("User", back_populates="xp_events")
+
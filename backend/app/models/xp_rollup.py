@@ -0,0 +1,19 @@
+from datetime import date
+
+from sqlalchemy import Date, ForeignKey, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+from app.models.xp_event import XPSource
+
+
+class XPDailyRollup(Base):
+    """Per-user, per-day, per-source XP totals maintained alongside xp_events."""
+
+    __tablename__ = "xp_daily_rollups"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    source: Mapped[XPSource] = mapped_column(String(32), primary_key=True)
+    amount: Mapped[int] = mapped_column(Integer, default=0)
+    count: Mapped[int] = mapped_column(Integer, default=0)
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: int
+    username: str
+    avatar_url: str | None
+    xp: int
+
+
+class LeaderboardRank(BaseModel):
+    rank: int | None
+    xp: int
+    neighbours: list[LeaderboardEntry]
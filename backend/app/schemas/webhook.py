@@ -0,0 +1,43 @@
+import msgspec
+
+
+# Push payloads are decoded with msgspec rather than pydantic: only the fields
+# declared here are materialized, and everything else in GitHub's payload
+# (author/committer blobs, messages, urls, head_commit, ...) is skipped by the
+# parser. See benchmarks/bench_push_decode.py.
+
+class Pusher(msgspec.Struct):
+    name: str | None = None
+
+
+class Sender(msgspec.Struct):
+    login: str | None = None
+
+
+class Repository(msgspec.Struct):
+    full_name: str = ""
+
+
+class WebhookPayload(msgspec.Struct):
+    pusher: Pusher | None = None
+    sender: Sender | None = None
+
+    @property
+    def actor_login(self) -> str | None:
+        return (self.pusher and self.pusher.name) or (self.sender and self.sender.login)
+
+
+class PushCommit(msgspec.Struct):
+    id: str | None = None
+    added: list[str] = []
+    removed: list[str] = []
+    modified: list[str] = []
+
+    @property
+    def files_changed(self) -> int:
+        return len(self.added) + len(self.removed) + len(self.modified)
+
+
+class PushEvent(WebhookPayload):
+    commits: list[PushCommit] = []
+    repository: Repository = msgspec.field(default_factory=Repository)
@@ -1,5 +1,6 @@
-from datetime import datetime
+from datetime import date, datetime
 
+import msgspec
 from pydantic import BaseModel
 
 from app.models.xp_event import XPSource
@@ -13,3 +14,30 @@ class XPEventOut(BaseModel):
     created_at: datetime
 
     model_config = {"from_attributes": True}
+
+
+class XPEventHistoryOut(BaseModel):
+    id: int
+    source: XPSource
+    amount: int
+    created_at: datetime
+    meta: dict | None = None  # only present when requested
+
+
+class XPHistoryPage(BaseModel):
+    items: list[XPEventHistoryOut]
+    next_cursor: str | None
+
+
+class XPDailyOut(BaseModel):
+    day: date
+    source: XPSource
+    amount: int
+    count: int
+
+    model_config = {"from_attributes": True}
+
+
+class SocketMessage(msgspec.Struct):
+    """Client -> server message on /events/ws, as JSON text or msgpack."""
+    ack: list[int] = []
@@ -1,40 +1,342 @@
+import asyncio
 import json
+import logging
+import os
+import secrets
+import socket
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Iterable
 from typing import Any
 
+import msgspec
+from redis.client import NEVER_DECODE
+
+from app.core.config import settings
 from app.core.redis import get_redis
 
+logger = logging.getLogger(__name__)
+
 DEFAULT_TTL = 300  # 5 minutes
 
+# L1: an in-process LRU in front of Redis, bounded by CACHE_LOCAL_MAX_ENTRIES and
+# CACHE_LOCAL_TTL. Writes and deletes are broadcast on INVALIDATION_CHANNEL so other
+# workers drop their copies. Values are shared between callers — treat them as read-only.
+INVALIDATION_CHANNEL = "cache:invalidate"
+_ORIGIN = f"{socket.gethostname()}-{os.getpid()}"
+_MISS = object()
+
+_local: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+# Bumped on every invalidation so a Redis read that raced one isn't stored in L1
+_generation = 0
+_pubsub = None
+_listener: asyncio.Task | None = None
+
+# Single-flight: one loader task per key in this process, and a Redis lock so only
+# one process runs it. Others wait for the value to land in the cache.
+LOCK_TTL_MS = 10_000
+LOCK_WAIT = 10.0
+LOCK_POLL = 0.05
+# Delete the lock only if we still hold it (it may have expired and been re-taken)
+_RELEASE_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+_inflight: dict[str, asyncio.Task] = {}
+_refreshing: dict[str, asyncio.Task] = {}  # stale-while-revalidate refreshes
+
+# Stored values are either bare JSON (what releases before codecs wrote, and what the
+# "json" codec still writes uncompressed so they can read it) or a two-byte header —
+# CODEC_VERSION, then the codec id with _COMPRESSED set if the body is zlib'd — and
+# the body. JSON text never starts with a control byte, so the two can't be confused.
+CODEC_VERSION = 1
+_COMPRESSED = 0x80
+COMPRESS_LEVEL = 1  # zlib; higher levels barely shrink these payloads further
+_CODECS: dict[str, tuple[int, Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    "json": (0, msgspec.json.encode, msgspec.json.decode),
+    "msgpack": (1, msgspec.msgpack.encode, msgspec.msgpack.decode),
+}
+_DECODERS = {codec_id: decode for codec_id, _, decode in _CODECS.values()}
+
+
+def _local_enabled() -> bool:
+    return settings.CACHE_LOCAL_MAX_ENTRIES > 0
+
+
+def _local_get(key: str) -> Any:
+    entry = _local.get(key)
+    if entry is None:
+        return _MISS
+    value, expires_at = entry
+    if expires_at < time.monotonic():
+        del _local[key]
+        return _MISS
+    _local.move_to_end(key)
+    return value
+
+
+def _local_set(key: str, value: Any, ttl: float) -> None:
+    _local[key] = (value, time.monotonic() + min(ttl, settings.CACHE_LOCAL_TTL))
+    _local.move_to_end(key)
+    if len(_local) > settings.CACHE_LOCAL_MAX_ENTRIES:
+        _local.popitem(last=False)
+
+
+def _local_drop(keys: Iterable[str]) -> None:
+    global _generation
+    _generation += 1
+    for key in keys:
+        _local.pop(key, None)
+
+
+def encode_value(value: Any) -> bytes:
+    codec_id, dumps, _ = _CODECS[settings.CACHE_CODEC]
+    body = dumps(value)
+    if settings.CACHE_COMPRESS_MIN_BYTES and len(body) >= settings.CACHE_COMPRESS_MIN_BYTES:
+        body, codec_id = zlib.compress(body, COMPRESS_LEVEL), codec_id | _COMPRESSED
+    elif settings.CACHE_CODEC == "json":
+        return body
+    return bytes((CODEC_VERSION, codec_id)) + body
+
+
+def decode_value(raw: bytes) -> Any:
+    if raw[0] >= 0x20:
+        return msgspec.json.decode(raw)
+    if raw[0] != CODEC_VERSION or (raw[1] & ~_COMPRESSED) not in _DECODERS:
+        raise ValueError(f"unknown cache codec {raw[:2].hex()}")
+    body = zlib.decompress(raw[2:]) if raw[1] & _COMPRESSED else raw[2:]
+    return _DECODERS[raw[1] & ~_COMPRESSED](body)
+
+
+async def _broadcast(redis, **message: Any) -> None:
+    if _local_enabled():
+        await redis.publish(INVALIDATION_CHANNEL, json.dumps({"origin": _ORIGIN, **message}))
+
+
+async def _listen() -> None:
+    while True:
+        try:
+            message = await _pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message is None:
+                continue
+            data = json.loads(message["data"])
+            if data["origin"] != _ORIGIN:
+                _local_drop(data["keys"])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Cache invalidation listener errored")
+            _local.clear()  # may have missed invalidations
+            await asyncio.sleep(1)
+
+
+async def start() -> None:
+    """Subscribe to invalidations from other workers. The L1 stays off without Redis."""
+    global _pubsub, _listener
+    redis = await get_redis()
+    if redis is None or not _local_enabled():
+        return
+    _pubsub = redis.pubsub()
+    await _pubsub.subscribe(INVALIDATION_CHANNEL)
+    _listener = asyncio.create_task(_listen())
+
+
+async def stop() -> None:
+    global _pubsub, _listener
+    if _listener is not None:
+        _listener.cancel()
+        await asyncio.gather(_listener, return_exceptions=True)
+    if _pubsub is not None:
+        await _pubsub.aclose()
+    _pubsub, _listener = None, None
+    _local.clear()
+
 
 async def cache_get(key: str) -> Any | None:
     redis = await get_redis()
     if redis is None:
         return None
-    value = await redis.get(key)
-    return json.loads(value) if value else None
+    if _listener is not None:
+        value = _local_get(key)
+        if value is not _MISS:
+            return value
+
+    generation = _generation
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.execute_command("GET", key, **{NEVER_DECODE: True})
+        pipe.pttl(key)
+        raw, pttl = await pipe.execute()
+    if not raw:
+        return None
+    try:
+        value = decode_value(raw)
+    except (ValueError, msgspec.DecodeError, zlib.error):
+        # e.g. written by a newer release during a rolling deploy; treat as a miss
+        logger.warning("Could not decode cached %s; ignoring it", key, exc_info=True)
+        return None
+    if _listener is not None and generation == _generation and pttl > 0:
+        _local_set(key, value, pttl / 1000)
+    return value
+
+
+def _tag_key(tag: str) -> str:
+    return f"tag:{tag}"
 
 
-async def cache_set(key: str, value: Any, ttl: int = DEFAULT_TTL) -> None:
+async def cache_set(key: str, value: Any, ttl: int = DEFAULT_TTL, tags: Iterable[str] = ()) -> None:
+    """
+    Store `value` under `key` for `ttl` seconds. Each of `tags` records the key in a
+    Redis set so invalidate_tag can later delete exactly the keys written under it.
+    """
     redis = await get_redis()
     if redis is None:
         return
-    await redis.set(key, json.dumps(value), ex=ttl)
+    _local_drop([key])
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.set(key, encode_value(value), ex=ttl)
+        for tag in tags:
+            pipe.sadd(_tag_key(tag), key)
+            # The set lives as long as its longest-lived key; members that expired
+            # before it are harmless, deleting them is a no-op
+            pipe.expire(_tag_key(tag), ttl, nx=True)
+            pipe.expire(_tag_key(tag), ttl, gt=True)
+        await pipe.execute()
+    await _broadcast(redis, keys=[key])
+    if _listener is not None:
+        _local_set(key, value, ttl)
 
 
 async def cache_delete(key: str) -> None:
+    await cache_delete_many([key])
+
+
+async def cache_delete_many(keys: Iterable[str], chunk_size: int = 1_000) -> None:
+    """Delete `keys` with one DEL and one invalidation broadcast per `chunk_size` keys."""
     redis = await get_redis()
     if redis is None:
         return
-    await redis.delete(key)
+    keys = list(keys)
+    for i in range(0, len(keys), chunk_size):
+        chunk = keys[i:i + chunk_size]
+        _local_drop(chunk)
+        await redis.delete(*chunk)
+        await _broadcast(redis, keys=chunk)
 
-async def cache_delete_pattern(pattern: str) -> None:
+
+async def invalidate_tag(tag: str) -> None:
+    """Delete every key written with `tag`. Costs O(keys under the tag), not a keyspace scan."""
     redis = await get_redis()
     if redis is None:
         return
-    cursor = 0
-    while True:
-        cursor, keys = await redis.scan(cursor, match=pattern, count=100)
-        if keys:
-            await redis.delete(*keys)
-        if cursor == 0:
-            break
+    # Read and drop the set together, so a key tagged after this point survives with its
+    # fresh value instead of losing its membership
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.smembers(_tag_key(tag))
+        pipe.delete(_tag_key(tag))
+        keys, _ = await pipe.execute()
+    if not keys:
+        return
+    keys = list(keys)
+    _local_drop(keys)
+    await redis.delete(*keys)
+    await _broadcast(redis, keys=keys)
+
+
+def _entry(value: Any, ttl: int, stale_ttl: int) -> Any:
+    """What get_or_compute stores: the bare value, or with stale_ttl an envelope carrying its soft expiry."""
+    if not stale_ttl:
+        return value
+    return {"value": value, "fresh_until": time.time() + ttl}
+
+
+async def _store(key: str, value: Any, ttl: int, stale_ttl: int, tags: Iterable[str]) -> Any:
+    entry = _entry(value, ttl, stale_ttl)
+    await cache_set(key, entry, ttl + stale_ttl, tags)
+    return entry
+
+
+def _start(registry: dict[str, asyncio.Task], key: str, coro: Awaitable[Any]) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    registry[key] = task
+    task.add_done_callback(lambda _: registry.pop(key, None))
+    return task
+
+
+def _usable(entry: Any, stale_ttl: int) -> bool:
+    # With stale_ttl only an envelope will do; a bare value was written without one,
+    # e.g. before stale_ttl was set for this key
+    return entry is not None and (not stale_ttl or (isinstance(entry, dict) and "fresh_until" in entry))
+
+
+async def _load_once(
+    key: str, ttl: int, stale_ttl: int, tags: Iterable[str], loader: Callable[[], Awaitable[Any]]
+) -> Any:
+    redis = await get_redis()
+    if redis is None:
+        return _entry(await loader(), ttl, stale_ttl)
+
+    lock_key = f"lock:{key}"
+    token = secrets.token_hex(8)
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        if await redis.set(lock_key, token, nx=True, px=LOCK_TTL_MS):
+            try:
+                return await _store(key, await loader(), ttl, stale_ttl, tags)
+            finally:
+                await redis.eval(_RELEASE_LOCK, 1, lock_key, token)
+        # Another process is loading — wait for its result rather than calling the loader too
+        await asyncio.sleep(LOCK_POLL)
+        entry = await cache_get(key)
+        if _usable(entry, stale_ttl):
+            return entry
+
+    logger.warning("Gave up waiting on %s after %.0fs; loading without the lock", lock_key, LOCK_WAIT)
+    return await _store(key, await loader(), ttl, stale_ttl, tags)
+
+
+async def _revalidate(
+    key: str, ttl: int, stale_ttl: int, tags: Iterable[str], loader: Callable[[], Awaitable[Any]]
+) -> None:
+    redis = await get_redis()
+    lock_key = f"lock:{key}"
+    token = secrets.token_hex(8)
+    if not await redis.set(lock_key, token, nx=True, px=LOCK_TTL_MS):
+        return  # another process is already refreshing it
+    try:
+        await _store(key, await loader(), ttl, stale_ttl, tags)
+    except Exception:
+        logger.exception("Background refresh of %s failed; serving the stale value", key)
+    finally:
+        await redis.eval(_RELEASE_LOCK, 1, lock_key, token)
+
+
+async def get_or_compute(
+    key: str,
+    ttl: int,
+    loader: Callable[[], Awaitable[Any]],
+    stale_ttl: int = 0,
+    tags: Iterable[str] = (),
+) -> Any:
+    """
+    Return the cached value for `key`, or run `loader` and cache its result for `ttl`
+    seconds. Concurrent misses share one loader call: in-process through a shared task,
+    across processes through a short Redis lock. Loader exceptions reach every waiter
+    and nothing is cached.
+
+    With `stale_ttl`, values stay cached that much longer past `ttl`. In that window the
+    stale value is returned immediately while one background task refreshes it.
+    `tags` are passed to cache_set on every store.
+    """
+    entry = await cache_get(key)
+    if _usable(entry, stale_ttl):
+        if stale_ttl and entry["fresh_until"] <= time.time() and key not in _refreshing:
+            _start(_refreshing, key, _revalidate(key, ttl, stale_ttl, tags, loader))
+        return entry["value"] if stale_ttl else entry
+
+    task = _inflight.get(key) or _start(_inflight, key, _load_once(key, ttl, stale_ttl, tags, loader))
+    # Shielded so a cancelled request doesn't cancel the load for everyone else
+    entry = await asyncio.shield(task)
+    return entry["value"] if stale_ttl else entry
@@ -0,0 +1,57 @@
+import hashlib
+import json
+import zlib
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import dialect_insert
+from app.models.commit_files import CommitFileList
+
+FileLists = tuple[list[str], list[str], list[str]]  # added, removed, modified
+
+
+def pack(added: list[str], removed: list[str], modified: list[str]) -> tuple[str, bytes]:
+    """Return (content hash, compressed blob) for a commit's file lists."""
+    raw = json.dumps({"added": added, "removed": removed, "modified": modified}, separators=(",", ":")).encode()
+    return hashlib.sha256(raw).hexdigest(), zlib.compress(raw)
+
+
+def unpack(data: bytes) -> dict[str, list[str]]:
+    return json.loads(zlib.decompress(data))
+
+
+async def store(db: AsyncSession, commits: list[FileLists]) -> list[str | None]:
+    """
+    Store each commit's file lists once per distinct content, in one INSERT ... ON CONFLICT
+    DO NOTHING. Returns the reference to keep in XPEvent.meta (None for commits with no files).
+    """
+    refs: list[str | None] = []
+    blobs: dict[str, bytes] = {}
+    for added, removed, modified in commits:
+        if not (added or removed or modified):
+            refs.append(None)
+            continue
+        ref, blob = pack(added, removed, modified)
+        blobs[ref] = blob
+        refs.append(ref)
+
+    if blobs:
+        stmt = dialect_insert(db, CommitFileList).values([{"hash": h, "data": b} for h, b in blobs.items()])
+        await db.execute(stmt.on_conflict_do_nothing(index_elements=[CommitFileList.hash]))
+    return refs
+
+
+async def load(db: AsyncSession, meta: dict | None) -> dict[str, list[str]]:
+    """File lists for a commit XPEvent — from the side table, or inline for events stored before it existed."""
+    meta = meta or {}
+    ref = meta.get("files_ref")
+    if ref is None:
+        return {
+            "added": meta.get("added_files", []),
+            "removed": meta.get("removed_files", []),
+            "modified": meta.get("modified_files", []),
+        }
+    result = await db.execute(select(CommitFileList.data).where(CommitFileList.hash == ref))
+    data = result.scalar_one_or_none()
+    return unpack(data) if data is not None else {"added": [], "removed": [], "modified": []}
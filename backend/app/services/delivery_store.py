@@ -0,0 +1,100 @@
+import json
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Any
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import after_commit, dialect_insert
+from app.core.redis import get_redis
+from app.models.webhook_delivery import WebhookDelivery
+
+_PENDING = "__pending__"
+CLAIM_TTL = 300  # an in-progress claim expires so a crashed worker doesn't block redelivery
+IN_PROGRESS = {"status": "duplicate", "processing": True}
+
+
+def _key(delivery_id: str) -> str:
+    return f"webhook:delivery:{delivery_id}"
+
+
+async def _get_recorded(db: AsyncSession, delivery_id: str) -> dict[str, Any] | None:
+    result = await db.execute(select(WebhookDelivery.result).where(WebhookDelivery.delivery_id == delivery_id))
+    row = result.first()
+    if row is None:
+        return None
+    # A row without a result was claimed by a transaction that hasn't recorded one yet
+    return row.result if row.result is not None else IN_PROGRESS
+
+
+async def get(db: AsyncSession, delivery_id: str) -> dict[str, Any] | None:
+    """Return the cached result of an already-seen delivery, or None if it is new."""
+    redis = await get_redis()
+    if redis is not None:
+        value = await redis.get(_key(delivery_id))
+        if value is None:
+            return None
+        return IN_PROGRESS if value == _PENDING else json.loads(value)
+    return await _get_recorded(db, delivery_id)
+
+
+async def claim(db: AsyncSession, delivery_id: str, event: str) -> dict[str, Any] | None:
+    """
+    Mark a delivery as in progress. Returns None if the caller should process it,
+    otherwise the result of the first processing.
+
+    The claim is a webhook_deliveries row inserted in the caller's transaction, so it
+    commits with the handler's writes and vanishes if they roll back; a concurrent claim
+    of the same delivery waits on that row. Redis SET NX in front turns most
+    redeliveries away before they reach the DB.
+    """
+    redis = await get_redis()
+    if redis is not None and not await redis.set(_key(delivery_id), _PENDING, nx=True, ex=CLAIM_TTL):
+        previous = await get(db, delivery_id)
+        if previous is not None:
+            return previous
+        # The key expired or was released since the SET; the row below settles it
+    result = await db.execute(
+        dialect_insert(db, WebhookDelivery)
+        .values(delivery_id=delivery_id, event=event)
+        .on_conflict_do_nothing(index_elements=[WebhookDelivery.delivery_id])
+        .returning(WebhookDelivery.delivery_id)
+    )
+    if result.first() is not None:
+        return None
+    # Processed before, but its Redis entry expired or was lost
+    return await _get_recorded(db, delivery_id)
+
+
+async def release(delivery_id: str) -> None:
+    """Drop an in-progress claim after a failure so GitHub's redelivery is processed."""
+    redis = await get_redis()
+    if redis is not None:
+        await redis.delete(_key(delivery_id))
+
+
+async def _cache_result(delivery_id: str, result: dict[str, Any]) -> None:
+    redis = await get_redis()
+    if redis is not None:
+        await redis.set(_key(delivery_id), json.dumps(result), ex=settings.WEBHOOK_DELIVERY_TTL)
+
+
+async def record(db: AsyncSession, delivery_id: str, result: dict[str, Any]) -> None:
+    """Store the result of a claimed delivery. The caller commits the session."""
+    await db.execute(
+        update(WebhookDelivery)
+        .where(WebhookDelivery.delivery_id == delivery_id)
+        .values(result=result)
+        .execution_options(synchronize_session=False)
+    )
+    after_commit(db, partial(_cache_result, delivery_id, result))
+
+
+async def prune(db: AsyncSession, older_than: timedelta) -> int:
+    """Delete delivery records older than `older_than`. Returns how many were removed."""
+    cutoff = datetime.now(timezone.utc) - older_than
+    result = await db.execute(delete(WebhookDelivery).where(WebhookDelivery.created_at < cutoff))
+    await db.commit()
+    return result.rowcount
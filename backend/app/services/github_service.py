@@ -4,6 +4,20 @@ import httpx
 GITHUB_API = "https://api.github.com"
 
 
+def repo_tag(full_name: str) -> str:
+    """Cache tag for everything read from one repo ("owner/name"); a push to it invalidates the tag."""
+    return f"github:repo:{full_name}"
+
+
+def cache_key(kind: str, user_id: int, *parts: str) -> str:
+    """
+    Key for a per-user GitHub listing cached with stale_ttl. v2 keys hold the
+    {"value", "fresh_until"} envelope; releases that predate it read the bare
+    github:{kind}:... keys and would serve an envelope as the listing itself.
+    """
+    return ":".join(("github", kind, "v2", str(user_id), *parts))
+
+
 async def fetch_user_profile(access_token: str) -> dict:
     async with httpx.AsyncClient(timeout=10.0) as client:
         resp = await client.get(
@@ -0,0 +1,200 @@
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.redis import get_redis
+from app.models.xp_event import XPEvent, XPSource
+from app.models.xp_rollup import XPDailyRollup
+from app.services.rollup_service import utc_midnight
+
+ALL_TIME = "all"
+WEEKLY = "week"
+BOARDS = {ALL_TIME, WEEKLY, *(source.value for source in XPSource)}
+
+WEEK_TTL = 60 * 60 * 24 * 15  # keep last week's board around briefly after rollover
+REBUILD_CHUNK = 10_000
+
+
+def _week_key(day: date) -> str:
+    year, week, _ = day.isocalendar()
+    return f"leaderboard:week:{year}-W{week:02d}"
+
+
+def _week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def board_key(board: str) -> str:
+    if board == WEEKLY:
+        return _week_key(datetime.now(timezone.utc).date())
+    if board == ALL_TIME:
+        return "leaderboard:all"
+    return f"leaderboard:source:{board}"
+
+
+async def record_awards(user_id: int, amounts: list[tuple[XPSource, int]]) -> None:
+    """ZINCRBY the all-time, current-week and per-source boards for freshly awarded XP."""
+    redis = await get_redis()
+    if redis is None:
+        return
+    by_source: Counter[XPSource] = Counter()
+    for source, amount in amounts:
+        by_source[source] += amount
+    total = sum(by_source.values())
+    if not total:
+        return
+
+    week_key = board_key(WEEKLY)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.zincrby(board_key(ALL_TIME), total, user_id)
+        pipe.zincrby(week_key, total, user_id)
+        pipe.expire(week_key, WEEK_TTL)
+        for source, amount in by_source.items():
+            if amount:
+                pipe.zincrby(board_key(source.value), amount, user_id)
+        await pipe.execute()
+
+
+async def remove_user(user_id: int) -> None:
+    redis = await get_redis()
+    if redis is None:
+        return
+    async with redis.pipeline(transaction=False) as pipe:
+        for board in BOARDS:
+            pipe.zrem(board_key(board), user_id)
+        await pipe.execute()
+
+
+def _entries(rows: list[tuple[str, float]], first_rank: int) -> list[dict[str, Any]]:
+    return [
+        {"rank": first_rank + i, "user_id": int(member), "xp": int(score)}
+        for i, (member, score) in enumerate(rows)
+    ]
+
+
+async def top(board: str, limit: int) -> list[dict[str, Any]]:
+    redis = await get_redis()
+    if redis is None:
+        return []
+    rows = await redis.zrevrange(board_key(board), 0, limit - 1, withscores=True)
+    return _entries(rows, 1)
+
+
+async def rank(board: str, user_id: int, radius: int = 0) -> tuple[int | None, int, list[dict[str, Any]]]:
+    """Return (1-based rank or None, xp, neighbours within `radius` places) — O(log n) via ZREVRANK."""
+    redis = await get_redis()
+    if redis is None:
+        return None, 0, []
+    key = board_key(board)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.zrevrank(key, user_id)
+        pipe.zscore(key, user_id)
+        position, score = await pipe.execute()
+    if position is None:
+        return None, 0, []
+
+    neighbours: list[dict[str, Any]] = []
+    if radius:
+        start = max(0, position - radius)
+        rows = await redis.zrevrange(key, start, position + radius, withscores=True)
+        neighbours = _entries(rows, start + 1)
+    return position + 1, int(score), neighbours
+
+
+async def _totals_by_source(
+    db: AsyncSession,
+    since: date | None,
+    start: date | None = None,
+    after_id: int | None = None,
+    upto_id: int | None = None,
+) -> list[tuple[int, str, int]]:
+    """
+    Per-user, per-source XP from `start` on (all time when None), limited to events with
+    ids in (after_id, upto_id]. Days before `since` have been archived out of xp_events,
+    so those come from xp_daily_rollups unless only events after `after_id` are wanted.
+    """
+    rows = []
+    if since is not None and after_id is None and (start is None or start < since):
+        query = (
+            select(XPDailyRollup.user_id, XPDailyRollup.source, func.sum(XPDailyRollup.amount))
+            .where(XPDailyRollup.day < since)
+        )
+        if start is not None:
+            query = query.where(XPDailyRollup.day >= start)
+        rows += (await db.execute(query.group_by(XPDailyRollup.user_id, XPDailyRollup.source))).all()
+
+    query = select(XPEvent.user_id, XPEvent.source, func.sum(XPEvent.amount))
+    lower = max((day for day in (start, since) if day is not None), default=None)
+    if lower is not None:
+        query = query.where(XPEvent.created_at >= utc_midnight(lower))
+    if after_id is not None:
+        query = query.where(XPEvent.id > after_id)
+    if upto_id is not None:
+        query = query.where(XPEvent.id <= upto_id)
+    rows += (await db.execute(query.group_by(XPEvent.user_id, XPEvent.source))).all()
+    return rows
+
+
+async def _board_totals(
+    db: AsyncSession, since: date | None, after_id: int | None = None, upto_id: int | None = None
+) -> dict[str, dict[int, int]]:
+    totals: dict[str, dict[int, int]] = {board: {} for board in BOARDS}
+    for user_id, source, amount in await _totals_by_source(db, since, None, after_id, upto_id):
+        for board in (source, ALL_TIME):
+            scores = totals.setdefault(board, {})
+            scores[user_id] = scores.get(user_id, 0) + int(amount)
+
+    week_start = _week_start(datetime.now(timezone.utc).date())
+    for user_id, _, amount in await _totals_by_source(db, since, week_start, after_id, upto_id):
+        totals[WEEKLY][user_id] = totals[WEEKLY].get(user_id, 0) + int(amount)
+    return totals
+
+
+async def rebuild(db: AsyncSession, since: date | None = None) -> int:
+    """
+    Repopulate every board from the xp_events ledger, plus the daily rollups for days
+    before `since` that have been archived out of it. Boards are built under temporary
+    keys and swapped in with RENAME so readers never see a partial board.
+    Returns the number of users ranked all-time.
+
+    Awards keep incrementing the live boards meanwhile, and the swap replaces those
+    increments. So the ledger is read up to a high-water event id, and events past it
+    are added to the temporary keys in the same MULTI as the RENAMEs. That leaves only
+    awards that commit out of id order or whose after-commit ZINCRBY straddles the swap,
+    a window of milliseconds; scripts/rebuild_leaderboards.py refuses to run while XP
+    is being awarded.
+    """
+    redis = await get_redis()
+    if redis is None:
+        raise RuntimeError("Redis is required to rebuild leaderboards")
+
+    high_water = (await db.execute(select(func.max(XPEvent.id)))).scalar() or 0
+    totals = await _board_totals(db, since, upto_id=high_water)
+    for board, scores in totals.items():
+        tmp_key = f"{board_key(board)}:rebuild"
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.delete(tmp_key)
+            members = list(scores.items())
+            for i in range(0, len(members), REBUILD_CHUNK):
+                pipe.zadd(tmp_key, dict(members[i:i + REBUILD_CHUNK]))
+            await pipe.execute()
+
+    late = await _board_totals(db, since, after_id=high_water)
+    async with redis.pipeline(transaction=True) as pipe:
+        for board in totals.keys() | late.keys():
+            key = board_key(board)
+            tmp_key = f"{key}:rebuild"
+            late_scores = late.get(board, {})
+            for user_id, amount in late_scores.items():
+                pipe.zincrby(tmp_key, amount, user_id)
+            if totals.get(board) or late_scores:
+                pipe.rename(tmp_key, key)
+                if board == WEEKLY:
+                    pipe.expire(key, WEEK_TTL)
+            else:
+                pipe.delete(key)
+        await pipe.execute()
+    return len(totals[ALL_TIME].keys() | late[ALL_TIME].keys())
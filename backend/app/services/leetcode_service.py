@@ -13,7 +13,7 @@ from app.models.user import User
 from app.schemas.leetcode import LeetCodeSolveCreate, LeetCodeSolveUpdate
 from app.services.xp_service import award_xp, XPSource
 from app.services.streak_service import update_streak
-from app.services.cache import cache_set, cache_get
+from app.services.cache import get_or_compute
 
 
 _LC_SEARCH_QUERY = """
@@ -45,10 +45,10 @@ _UA = (
 
 async def search_problems(query: str) -> list[dict]:
     cache_key = f"leetcode:search:{query.lower().strip()}"
-    cached = await cache_get(cache_key)
-    if cached:
-        return cached
+    return await get_or_compute(cache_key, 60 * 60 * 24, lambda: _fetch_problems(query))  # 24 hours
 
+
+async def _fetch_problems(query: str) -> list[dict]:
     async with httpx.AsyncClient(timeout=15.0, follow_redirects=True) as client:
         # Acquire CSRF cookie by hitting the problemset page first
         await client.get(
@@ -92,8 +92,6 @@ async def search_problems(query: str) -> list[dict]:
             }
             for q in questions
         ]
-
-    await cache_set(cache_key, result, ttl=60 * 60 * 24)  # 24 hours
     return result
 
 async def log_solve(
@@ -0,0 +1,94 @@
+import time
+from collections import OrderedDict
+
+from app.core.redis import get_redis
+
+# github_login -> user_id, with UNKNOWN (0) recorded for logins that aren't Shepherd users.
+# Layered as an in-process LRU in front of Redis shared by all workers: known logins in
+# one hash, unknown ones in short-lived keys of their own.
+UNKNOWN = 0
+
+HASH_KEY = "github_login:user_id"
+HASH_TTL = 60 * 60 * 24  # the whole hash is rebuilt daily so logins of deleted users don't pile up
+# A miss stored just after a signup's invalidate() (the webhook read the DB before the
+# user row committed) would drop that user's pushes; it only lasts this long.
+UNKNOWN_TTL = 5 * 60
+LOCAL_MAX = 10_000
+LOCAL_TTL = 60  # bounds staleness in other processes after an invalidation
+
+_local: OrderedDict[str, tuple[int, float]] = OrderedDict()
+
+
+def _unknown_key(login: str) -> str:
+    return f"github_login:unknown:{login}"
+
+
+def _local_get(login: str) -> int | None:
+    entry = _local.get(login)
+    if entry is None:
+        return None
+    user_id, expires_at = entry
+    if expires_at < time.monotonic():
+        del _local[login]
+        return None
+    _local.move_to_end(login)
+    return user_id
+
+
+def _local_set(login: str, user_id: int) -> None:
+    _local[login] = (user_id, time.monotonic() + LOCAL_TTL)
+    _local.move_to_end(login)
+    if len(_local) > LOCAL_MAX:
+        _local.popitem(last=False)
+
+
+async def lookup(login: str) -> int | None:
+    """Return the cached user id, UNKNOWN for a cached miss, or None if not cached."""
+    user_id = _local_get(login)
+    if user_id is not None:
+        return user_id
+
+    redis = await get_redis()
+    if redis is None:
+        return None
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hget(HASH_KEY, login)
+        pipe.exists(_unknown_key(login))
+        value, unknown = await pipe.execute()
+    if value is not None and int(value) != UNKNOWN:
+        user_id = int(value)
+    elif unknown:
+        user_id = UNKNOWN
+    else:
+        return None  # including a 0 that older releases kept in the hash
+    _local_set(login, user_id)
+    return user_id
+
+
+async def store(login: str, user_id: int | None) -> None:
+    user_id = user_id or UNKNOWN
+    _local_set(login, user_id)
+    redis = await get_redis()
+    if redis is None:
+        return
+    if user_id == UNKNOWN:
+        await redis.set(_unknown_key(login), 1, ex=UNKNOWN_TTL)
+        return
+    await redis.hset(HASH_KEY, login, user_id)
+    await redis.expire(HASH_KEY, HASH_TTL, nx=True)
+
+
+async def invalidate(*logins: str) -> None:
+    """Forget cached resolutions — call when a user is created or their login changes."""
+    logins = tuple(login for login in logins if login)
+    if not logins:
+        return
+    for login in logins:
+        _local.pop(login, None)
+    redis = await get_redis()
+    if redis is None:
+        return
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hdel(HASH_KEY, *logins)
+        pipe.delete(*(_unknown_key(login) for login in logins))
+        await pipe.execute()
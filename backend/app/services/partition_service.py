@@ -0,0 +1,144 @@
+import gzip
+import json
+import re
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.xp_event import XPEvent
+from app.services import rollup_service
+from app.services.rollup_service import utc_midnight
+
+# On Postgres xp_events is range-partitioned by month on created_at (see the
+# partition_xp_events migration). Partitions are named xp_events_pYYYYMM, with
+# xp_events_default catching anything outside the created ranges. Months are UTC
+# months, matching the UTC days of xp_daily_rollups.
+PARENT = "xp_events"
+DEFAULT_PARTITION = f"{PARENT}_default"
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_p{month:%Y%m}"
+
+
+def is_partition(table_name: str) -> bool:
+    """Whether `table_name` is one of xp_events' partitions, which exist only in the database."""
+    return re.fullmatch(rf"{PARENT}_(p\d{{6}}|default)", table_name) is not None
+
+
+def _bound(month: date) -> str:
+    # Explicit offset: a bare date would be read in the session's time zone
+    return f"{month.isoformat()} 00:00:00+00"
+
+
+def _is_postgres(db: AsyncSession) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+async def list_partitions(db: AsyncSession) -> list[date]:
+    """Months that currently have a partition attached, oldest first."""
+    result = await db.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:parent AS regclass)"
+    ), {"parent": PARENT})
+    months = []
+    for (name,) in result.all():
+        if name.startswith(f"{PARENT}_p"):
+            months.append(datetime.strptime(name.removeprefix(f"{PARENT}_p"), "%Y%m").date())
+    return sorted(months)
+
+
+async def retained_since(db: AsyncSession) -> date | None:
+    """
+    First day still held in xp_events, or None when nothing has been archived away.
+    Earlier days only survive in xp_daily_rollups.
+    """
+    if not _is_postgres(db):
+        return None
+    months = await list_partitions(db)
+    return months[0] if months else None
+
+
+async def create_partition(db: AsyncSession, month: date) -> None:
+    """Create the partition for `month`, moving any rows that already landed in the default partition."""
+    name = partition_name(month)
+    lower, upper = _bound(month), _bound(_add_months(month, 1))
+    in_range = f"created_at >= '{lower}' AND created_at < '{upper}'"
+    stranded = (await db.execute(text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_range})"))).scalar()
+
+    if stranded:
+        await db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {DEFAULT_PARTITION}"))
+    await db.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT} FOR VALUES FROM ('{lower}') TO ('{upper}')"
+    ))
+    if stranded:
+        await db.execute(text(f"INSERT INTO {PARENT} SELECT * FROM {DEFAULT_PARTITION} WHERE {in_range}"))
+        await db.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_range}"))
+        await db.execute(text(f"ALTER TABLE {PARENT} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+    await db.commit()
+
+
+async def ensure_partitions(db: AsyncSession, months_ahead: int = 3) -> list[date]:
+    """Create partitions from the current month through `months_ahead`. Returns the months created."""
+    if not _is_postgres(db):
+        return []
+    existing = set(await list_partitions(db))
+    this_month = _month_start(datetime.now(timezone.utc).date())
+    created = []
+    for offset in range(months_ahead + 1):
+        month = _add_months(this_month, offset)
+        if month not in existing:
+            await create_partition(db, month)
+            created.append(month)
+    return created
+
+
+async def archive_partition(db: AsyncSession, month: date, archive_dir: Path) -> Path:
+    """
+    Write one month of xp_events to gzipped NDJSON, refresh its rollups, then detach
+    and drop the partition. The file is fully written before anything is dropped.
+    """
+    lower, upper = month, _add_months(month, 1)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    path = archive_dir / f"{partition_name(month)}.ndjson.gz"
+
+    rows = await db.stream(
+        select(XPEvent.__table__)
+        .where(XPEvent.created_at >= utc_midnight(lower), XPEvent.created_at < utc_midnight(upper))
+        .order_by(XPEvent.created_at, XPEvent.id)
+        .execution_options(yield_per=5_000)
+    )
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        async for row in rows.mappings():
+            f.write(json.dumps(dict(row), default=str) + "\n")
+
+    # Recompute the month's rollups so they stay exact once its rows are gone
+    await rollup_service.rebuild_days(db, lower, upper)
+    name = partition_name(month)
+    await db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+    await db.execute(text(f"DROP TABLE {name}"))
+    await db.commit()
+    return path
+
+
+async def archive_older_than(db: AsyncSession, horizon_months: int, archive_dir: Path) -> list[Path]:
+    """Archive every partition that ends before the start of the month `horizon_months` ago."""
+    if not _is_postgres(db):
+        return []
+    cutoff = _add_months(_month_start(datetime.now(timezone.utc).date()), -horizon_months)
+    archived = []
+    for month in await list_partitions(db):
+        if _add_months(month, 1) <= cutoff:
+            archived.append(await archive_partition(db, month, archive_dir))
+    return archived
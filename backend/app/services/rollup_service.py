@@ -0,0 +1,87 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timezone
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import dialect_insert
+from app.models.xp_event import XPEvent, XPSource
+from app.models.xp_rollup import XPDailyRollup
+
+
+def utc_midnight(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def utc_day(db: AsyncSession, created_at):
+    """The UTC date of `created_at`, as record() uses. Postgres' date() alone follows the session time zone."""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date(func.timezone("UTC", created_at))
+    return func.date(created_at)
+
+
+async def record(db: AsyncSession, user_id: int, amounts: list[tuple[XPSource, int]]) -> None:
+    """Upsert today's rollup rows for freshly inserted XP events, in the caller's transaction."""
+    day = datetime.now(timezone.utc).date()
+    totals: dict[XPSource, list[int]] = defaultdict(lambda: [0, 0])
+    for source, amount in amounts:
+        totals[source][0] += amount
+        totals[source][1] += 1
+    if not totals:
+        return
+
+    stmt = dialect_insert(db, XPDailyRollup).values([
+        {"user_id": user_id, "day": day, "source": source, "amount": amount, "count": count}
+        for source, (amount, count) in totals.items()
+    ])
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[XPDailyRollup.user_id, XPDailyRollup.day, XPDailyRollup.source],
+        set_={
+            "amount": XPDailyRollup.amount + stmt.excluded.amount,
+            "count": XPDailyRollup.count + stmt.excluded.count,
+        },
+    ))
+
+
+async def daily_totals(db: AsyncSession, user_id: int, since: date) -> list[XPDailyRollup]:
+    result = await db.execute(
+        select(XPDailyRollup)
+        .where(XPDailyRollup.user_id == user_id, XPDailyRollup.day >= since)
+        .order_by(XPDailyRollup.day, XPDailyRollup.source)
+    )
+    return list(result.scalars().all())
+
+
+async def rebuild_days(db: AsyncSession, lower: date | None = None, upper: date | None = None) -> int:
+    """
+    Recompute the rollup rows for days in [lower, upper) (unbounded where None) from the
+    xp_events ledger in one INSERT ... SELECT, in the caller's transaction. Returns rows written.
+    """
+    day = utc_day(db, XPEvent.created_at)
+    stale = delete(XPDailyRollup)
+    events = select(XPEvent.user_id, day, XPEvent.source, func.sum(XPEvent.amount), func.count())
+    if lower is not None:
+        stale = stale.where(XPDailyRollup.day >= lower)
+        events = events.where(XPEvent.created_at >= utc_midnight(lower))
+    if upper is not None:
+        stale = stale.where(XPDailyRollup.day < upper)
+        events = events.where(XPEvent.created_at < utc_midnight(upper))
+
+    await db.execute(stale)
+    result = await db.execute(
+        dialect_insert(db, XPDailyRollup).from_select(
+            ["user_id", "day", "source", "amount", "count"],
+            events.group_by(XPEvent.user_id, day, XPEvent.source),
+        )
+    )
+    return result.rowcount
+
+
+async def rebuild(db: AsyncSession, since: date | None = None) -> int:
+    """
+    Recompute the rollup rows from the xp_events ledger. Days before `since` have been
+    archived out of the ledger and are left alone. Returns rows written.
+    """
+    written = await rebuild_days(db, since)
+    await db.commit()
+    return written
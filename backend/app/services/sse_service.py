@@ -1,27 +1,408 @@
 import asyncio
-from collections import defaultdict
+import json
+import logging
+import os
+import re
+import socket
+import time
+from collections import Counter
 
-# user_id -> list of active queues (one per open SSE connection)
-_queues: dict[int, list[asyncio.Queue]] = defaultdict(list)
+import msgspec
 
+from app.core.config import settings
+from app.core.redis import get_redis
 
-def connect(user_id: int) -> asyncio.Queue:
-    q: asyncio.Queue = asyncio.Queue()
-    _queues[user_id].append(q)
+logger = logging.getLogger(__name__)
+
+# What a full connection queue does with a new event (SSE_OVERFLOW_POLICY)
+DROP_OLDEST = "drop_oldest"
+COALESCE = "coalesce"  # merge into a queued xp_gained, else drop the oldest
+DISCONNECT = "disconnect"
+
+# How often each policy fired in this process
+overflow_counts: Counter[str] = Counter()
+# Connections refused by limit ("user" / "process") and streams closed for idling ("idle")
+connection_counts: Counter[str] = Counter()
+# Local connections reached per delivered event -> number of deliveries
+fanout_sizes: Counter[int] = Counter()
+# Events folded into another within the coalescing window, by type
+coalesced_counts: Counter[str] = Counter()
+
+
+class ConnectionLimitError(Exception):
+    """connect() refused: the user or this process already has the maximum open streams."""
+
+    def __init__(self, scope: str):
+        super().__init__(f"SSE connection limit reached ({scope})")
+        self.scope = scope
+
+KEEPALIVE_SECONDS = 25
+
+
+class Event:
+    """
+    One pushed event. The same instance is queued for every connection it reaches,
+    so its SSE wire frame is encoded once and shared rather than once per stream.
+    """
+
+    __slots__ = ("type", "data", "id", "_frame", "_socket_frames")
+
+    def __init__(self, type: str, data: dict, id: str | None = None, frame: bytes | None = None):
+        self.type = type
+        self.data = data
+        self.id = id
+        self._frame = frame
+        self._socket_frames: dict[str, str | bytes] = {}
+
+    @property
+    def frame(self) -> bytes:
+        if self._frame is None:
+            head = f"id: {self.id}\n" if self.id else ""
+            self._frame = f"{head}event: {self.type}\ndata: {json.dumps(self.data)}\n\n".encode()
+        return self._frame
+
+    def socket_frame(self, fmt: str) -> str | bytes:
+        """Compact WebSocket frame {"id", "t", "d"}: JSON text, or msgpack bytes when fmt is "msgpack"."""
+        frame = self._socket_frames.get(fmt)
+        if frame is None:
+            body = {"t": self.type, "d": self.data, **({"id": self.id} if self.id else {})}
+            if fmt == "msgpack":
+                frame = msgspec.msgpack.encode(body)
+            else:
+                frame = json.dumps(body, separators=(",", ":"))
+            self._socket_frames[fmt] = frame
+        return frame
+
+
+KEEPALIVE = Event("keepalive", {}, frame=b": keepalive\n\n")
+RESYNC = Event("resync", {})  # the replay buffer had a gap — catch up via /events/unread
+
+
+def _merge_xp(older: Event, newer: Event) -> Event:
+    """Fold two xp_gained events into one cumulative event carrying the newer totals."""
+    a, b = older.data, newer.data
+    return Event("xp_gained", {
+        **b,
+        "amount": a.get("amount", 0) + b.get("amount", 0),
+        "count": a.get("count", 1) + b.get("count", 1),
+        "level_up": a.get("level_up", False) or b.get("level_up", False),
+        "event_ids": a.get("event_ids", []) + b.get("event_ids", []),
+    }, newer.id)
+
+
+class ConnectionQueue(asyncio.Queue):
+    """
+    Bounded queue for one SSE or WebSocket connection, so a stalled client can hold
+    at most SSE_QUEUE_SIZE events. A None item tells the stream to close. `acks`
+    marks connections whose client confirms receipt (WebSockets).
+    """
+
+    def __init__(self, maxsize: int, acks: bool = False):
+        super().__init__(maxsize)
+        self.acks = acks
+        self.closed = False
+        self.last_event_at = time.monotonic()  # keepalives don't count
+
+    def offer(self, event: Event) -> bool:
+        """Enqueue without blocking, applying the overflow policy when full. False if the event was not queued."""
+        if self.closed:
+            return False
+        self.last_event_at = time.monotonic()
+        if not self.full():
+            self.put_nowait(event)
+            return True
+
+        policy = settings.SSE_OVERFLOW_POLICY
+        if policy == DISCONNECT:
+            overflow_counts[DISCONNECT] += 1
+            self.close()
+            return False
+        if policy == COALESCE and event.type == "xp_gained" and self._queue[-1].type == "xp_gained":
+            overflow_counts[COALESCE] += 1
+            # Queued events are shared between a user's connections — replace, don't mutate
+            self._queue[-1] = _merge_xp(self._queue[-1], event)
+            return True
+        overflow_counts[DROP_OLDEST] += 1
+        self.get_nowait()
+        self.put_nowait(event)
+        return True
+
+    def close(self) -> None:
+        """Discard anything pending and wake the stream so it ends."""
+        self.closed = True
+        while not self.empty():
+            self.get_nowait()
+        self.put_nowait(None)
+
+
+# Connection registry: user_id -> active queues (one per open SSE connection in
+# this process). Users are removed as soon as their last stream disconnects.
+_queues: dict[int, list[ConnectionQueue]] = {}
+_connection_total = 0
+
+# Cross-process fan-out: push() publishes to per-user channels and every process
+# subscribes (over one shared connection) to the channels of users it holds
+# connections for. PUBLISH returns how many processes received the event.
+# Streams and acking sockets use separate channels, so push() can tell whether
+# any fire-and-forget stream got the event.
+_pubsub = None
+_listener: asyncio.Task | None = None
+_heartbeat: asyncio.Task | None = None
+_PROCESS_CHANNEL = f"sse:process:{socket.gethostname()}-{os.getpid()}"
+
+
+def _channel(user_id: int, acks: bool = False) -> str:
+    return f"{'ws' if acks else 'sse'}:user:{user_id}"
+
+
+# Every pushed event is also appended to a per-user Redis Stream, capped by
+# SSE_REPLAY_MAXLEN entries and SSE_REPLAY_SECONDS of age. The stream entry id
+# doubles as the SSE event id, so a reconnecting EventSource's Last-Event-ID
+# says exactly where to resume.
+_EVENT_ID = re.compile(r"\d+-\d+")
+
+
+def _replay_key(user_id: int) -> str:
+    return f"sse:replay:{user_id}"
+
+
+def _id_key(event_id: str) -> tuple[int, int]:
+    ms, seq = event_id.split("-")
+    return int(ms), int(seq)
+
+
+def is_after(event_id: str, other_id: str) -> bool:
+    return _id_key(event_id) > _id_key(other_id)
+
+
+def _deliver_local(user_id: int, event: Event, acks: bool) -> int:
+    queues = [q for q in _queues.get(user_id, []) if q.acks == acks]
+    if queues:
+        fanout_sizes[len(queues)] += 1
+    return sum(q.offer(event) for q in queues)
+
+
+# Coalescing window: events of SSE_COALESCE_TYPES are held for SSE_COALESCE_WINDOW_MS
+# and merged with same-type events for the same user (and, for other types than
+# xp_gained, the same data["id"]), so a burst renders as one frame. Held events are
+# flushed before any other event for the user to keep ordering.
+_held: dict[tuple[int, bool], dict[tuple[str, object], Event]] = {}
+
+
+def _merge(older: Event, newer: Event) -> Event:
+    if newer.type == "xp_gained":
+        return _merge_xp(older, newer)
+    return Event(newer.type, {**older.data, **newer.data}, newer.id)
+
+
+def _flush(user_id: int, acks: bool) -> None:
+    for event in _held.pop((user_id, acks), {}).values():
+        _deliver_local(user_id, event, acks)
+
+
+def _dispatch(user_id: int, event: Event, acks: bool) -> int:
+    """Deliver to this process's connections, through the coalescing window when it applies."""
+    window = settings.SSE_COALESCE_WINDOW_MS
+    if not window or event.type not in settings.SSE_COALESCE_TYPES:
+        _flush(user_id, acks)
+        return _deliver_local(user_id, event, acks)
+
+    held = _held.get((user_id, acks))
+    if held is None:
+        held = _held[(user_id, acks)] = {}
+        asyncio.get_running_loop().call_later(window / 1000, _flush, user_id, acks)
+    key = (event.type, None if event.type == "xp_gained" else event.data.get("id"))
+    if key in held:
+        coalesced_counts[event.type] += 1
+        event = _merge(held[key], event)
+    held[key] = event
+    return sum(q.acks == acks for q in _queues.get(user_id, []))
+
+
+async def _listen() -> None:
+    while True:
+        try:
+            message = await _pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message is None or message["channel"] == _PROCESS_CHANNEL:
+                continue
+            prefix, _, user_id = message["channel"].rpartition(":")
+            _dispatch(int(user_id), Event(**json.loads(message["data"])), acks=prefix == "ws:user")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("SSE subscriber errored")
+            await asyncio.sleep(1)
+
+
+async def _beat() -> None:
+    """
+    One timer for every stream in the process instead of a wait_for per connection.
+    Also closes streams that haven't carried an event for SSE_IDLE_SECONDS.
+    """
+    while True:
+        await asyncio.sleep(KEEPALIVE_SECONDS)
+        idle_before = time.monotonic() - settings.SSE_IDLE_SECONDS if settings.SSE_IDLE_SECONDS else None
+        for queues in list(_queues.values()):
+            for q in queues:
+                if q.closed:
+                    continue
+                if idle_before is not None and q.last_event_at < idle_before:
+                    connection_counts["idle"] += 1
+                    q.close()
+                elif q.empty():
+                    q.put_nowait(KEEPALIVE)
+
+
+async def start() -> None:
+    """
+    Start this process's heartbeat and subscriber tasks. Without Redis, push()
+    only reaches local connections.
+    """
+    global _pubsub, _listener, _heartbeat
+    _heartbeat = asyncio.create_task(_beat())
+    redis = await get_redis()
+    if redis is None:
+        return
+    _pubsub = redis.pubsub()
+    # Keeps the pubsub connection open even while no users are connected here
+    channels = {_channel(user_id, q.acks) for user_id, queues in _queues.items() for q in queues}
+    await _pubsub.subscribe(_PROCESS_CHANNEL, *channels)
+    _listener = asyncio.create_task(_listen())
+
+
+async def stop() -> None:
+    global _pubsub, _listener, _heartbeat
+    tasks = [task for task in (_listener, _heartbeat) if task is not None]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if _pubsub is not None:
+        await _pubsub.aclose()
+    _pubsub, _listener, _heartbeat = None, None, None
+
+
+def _has_transport(queues: list[ConnectionQueue], acks: bool) -> bool:
+    return any(q.acks == acks for q in queues)
+
+
+async def connect(user_id: int, acks: bool = False) -> ConnectionQueue:
+    """Register a connection for the user. Raises ConnectionLimitError when a limit is reached."""
+    global _connection_total
+    queues = _queues.get(user_id, [])
+    if len(queues) >= settings.SSE_MAX_CONNECTIONS_PER_USER:
+        connection_counts["user"] += 1
+        raise ConnectionLimitError("user")
+    if _connection_total >= settings.SSE_MAX_CONNECTIONS:
+        connection_counts["process"] += 1
+        raise ConnectionLimitError("process")
+
+    q = ConnectionQueue(settings.SSE_QUEUE_SIZE, acks)
+    first = not _has_transport(queues, acks)
+    _queues.setdefault(user_id, []).append(q)
+    _connection_total += 1
+    if first and _pubsub is not None:
+        await _pubsub.subscribe(_channel(user_id, acks))
     return q
 
 
-def disconnect(user_id: int, q: asyncio.Queue) -> None:
-    try:
-        _queues[user_id].remove(q)
-    except ValueError:
-        pass
+async def disconnect(user_id: int, q: ConnectionQueue) -> None:
+    global _connection_total
+    queues = _queues.get(user_id)
+    if not queues or q not in queues:
+        return
+    queues.remove(q)
+    _connection_total -= 1
+    if not queues:
+        del _queues[user_id]
+    if not _has_transport(queues, q.acks) and _pubsub is not None:
+        await _pubsub.unsubscribe(_channel(user_id, q.acks))
 
 
 async def push(user_id: int, event_type: str, data: dict) -> bool:
-    """Push an event to all active SSE connections for a user.
-    Returns True if delivered to at least one connection (user was online)."""
-    queues = list(_queues.get(user_id, []))
-    for q in queues:
-        await q.put({"type": event_type, "data": data})
-    return len(queues) > 0
+    """
+    Push an event to all of a user's active connections, in any process. Returns True
+    if at least one SSE stream received it. WebSocket clients confirm receipt with
+    acks instead, so reaching only those returns False.
+    """
+    event = Event(event_type, data)
+    redis = await get_redis()
+    if redis is None or _pubsub is None:
+        _dispatch(user_id, event, acks=True)
+        return _dispatch(user_id, event, acks=False) > 0
+
+    key = _replay_key(user_id)
+    min_id = int((time.time() - settings.SSE_REPLAY_SECONDS) * 1000)
+    encoded = json.dumps(data)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.xadd(key, {"type": event_type, "data": encoded},
+                  maxlen=settings.SSE_REPLAY_MAXLEN, approximate=True)
+        pipe.xtrim(key, minid=min_id, approximate=True)
+        pipe.expire(key, settings.SSE_REPLAY_SECONDS)
+        event.id, *_ = await pipe.execute()
+    message = f'{{"id": "{event.id}", "type": {json.dumps(event_type)}, "data": {encoded}}}'
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.publish(_channel(user_id), message)
+        pipe.publish(_channel(user_id, acks=True), message)
+        streams, _ = await pipe.execute()
+    return streams > 0
+
+
+async def replay(user_id: int, last_event_id: str) -> tuple[list[Event], bool]:
+    """
+    Events pushed after `last_event_id`, oldest first, and whether the buffer still
+    reaches back to that id. False means events may have been missed and the client
+    should fall back to /events/unread.
+    """
+    redis = await get_redis()
+    if redis is None or not _EVENT_ID.fullmatch(last_event_id):
+        return [], False
+    entries = await redis.xrange(_replay_key(user_id), min=last_event_id)
+    resumed = bool(entries) and entries[0][0] == last_event_id
+    events = [
+        Event(fields["type"], json.loads(fields["data"]), entry_id)
+        for entry_id, fields in entries
+        if entry_id != last_event_id
+    ]
+    return events, resumed
+
+
+async def follow(user_id: int, q: ConnectionQueue, last_event_id: str | None = None):
+    """
+    Yield a connection's events: RESYNC if the replay buffer has a gap, the events
+    missed since `last_event_id`, then live events (and keepalives) until the queue
+    is closed. Live copies of replayed events are skipped; replaying after connect()
+    means nothing pushed in between is lost.
+    """
+    missed, resumed = [], True
+    if last_event_id:
+        missed, resumed = await replay(user_id, last_event_id)
+    seen = missed[-1].id if missed else (last_event_id if resumed else None)
+    if not resumed:
+        yield RESYNC
+    for event in missed:
+        yield event
+    while (event := await q.get()) is not None:  # None: closed for overflow or idling
+        if seen and event.id and not is_after(event.id, seen):
+            continue
+        yield event
+
+
+def stats() -> dict:
+    """Per-process snapshot of the registry, for capacity planning of the SSE tier."""
+    depths = [q.qsize() for queues in _queues.values() for q in queues]
+    return {
+        "connections": _connection_total,
+        "sockets": sum(q.acks for queues in _queues.values() for q in queues),
+        "users": len(_queues),
+        "limits": {
+            "per_user": settings.SSE_MAX_CONNECTIONS_PER_USER,
+            "process": settings.SSE_MAX_CONNECTIONS,
+        },
+        "queued_events": sum(depths),
+        "max_queue_depth": max(depths, default=0),
+        "fanout_sizes": dict(sorted(fanout_sizes.items())),
+        "overflows": dict(overflow_counts),
+        "coalesced": dict(coalesced_counts),
+        "refused": {scope: connection_counts[scope] for scope in ("user", "process")},
+        "idle_closed": connection_counts["idle"],
+    }
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import os
+import socket
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from redis.exceptions import ResponseError
+
+from app.core.config import settings
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+STREAM = "webhooks:github"
+DEAD_LETTER_STREAM = "webhooks:github:dead"
+GROUP = "webhook-workers"
+
+READ_COUNT = 10
+BLOCK_MS = 5000
+CLAIM_IDLE_MS = 60_000  # re-deliver messages a crashed worker left pending for this long
+
+# Processor: (event_type, delivery_id, body) -> result dict
+Processor = Callable[[str, str, str], Awaitable[dict[str, Any]]]
+
+_tasks: list[asyncio.Task] = []
+
+
+async def enqueue(event_type: str, delivery_id: str, body: bytes) -> str | None:
+    """Append a raw delivery to the stream. Returns the stream id, or None if Redis is unavailable."""
+    redis = await get_redis()
+    if redis is None:
+        return None
+    return await redis.xadd(
+        STREAM,
+        {"event": event_type, "delivery": delivery_id, "body": body.decode()},
+        maxlen=settings.WEBHOOK_STREAM_MAXLEN,
+        approximate=True,
+    )
+
+
+async def _ensure_group(redis) -> None:
+    try:
+        await redis.xgroup_create(STREAM, GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def _dead_letter(redis, msg_id: str, fields: dict[str, str], error: str) -> None:
+    await redis.xadd(
+        DEAD_LETTER_STREAM,
+        {**fields, "source_id": msg_id, "error": error},
+        maxlen=settings.WEBHOOK_STREAM_MAXLEN,
+        approximate=True,
+    )
+    await redis.xack(STREAM, GROUP, msg_id)
+
+
+async def _handle(redis, msg_id: str, fields: dict[str, str], process: Processor) -> None:
+    try:
+        await process(fields.get("event", ""), fields.get("delivery", ""), fields.get("body", ""))
+    except Exception as e:
+        logger.exception("Webhook delivery %s failed", msg_id)
+        pending = await redis.xpending_range(STREAM, GROUP, min=msg_id, max=msg_id, count=1)
+        attempts = pending[0]["times_delivered"] if pending else 1
+        if attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+            await _dead_letter(redis, msg_id, fields, repr(e))
+        # otherwise leave it pending — it is re-claimed after CLAIM_IDLE_MS
+        return
+    await redis.xack(STREAM, GROUP, msg_id)
+
+
+async def _worker(consumer: str, process: Processor) -> None:
+    redis = await get_redis()
+    while True:
+        try:
+            # Pick up deliveries abandoned by crashed or failing consumers first
+            _, claimed, *_ = await redis.xautoclaim(
+                STREAM, GROUP, consumer, min_idle_time=CLAIM_IDLE_MS, start_id="0-0", count=READ_COUNT
+            )
+            for msg_id, fields in claimed:
+                await _handle(redis, msg_id, fields, process)
+
+            response = await redis.xreadgroup(GROUP, consumer, {STREAM: ">"}, count=READ_COUNT, block=BLOCK_MS)
+            for _, messages in response or []:
+                for msg_id, fields in messages:
+                    await _handle(redis, msg_id, fields, process)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Webhook worker %s errored", consumer)
+            await asyncio.sleep(1)
+
+
+async def start_workers(process: Processor) -> None:
+    """Start the consumer-group worker pool. No-op when the queue is disabled or Redis is unavailable."""
+    redis = await get_redis()
+    if not settings.WEBHOOK_QUEUE_ENABLED or redis is None:
+        return
+    await _ensure_group(redis)
+    prefix = f"{socket.gethostname()}-{os.getpid()}"
+    for i in range(settings.WEBHOOK_WORKERS):
+        _tasks.append(asyncio.create_task(_worker(f"{prefix}-{i}", process)))
+
+
+async def stop_workers() -> None:
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
@@ -1,13 +1,19 @@
-from datetime import date, timezone
+from bisect import bisect_right
+from collections import Counter
+from datetime import datetime, time, timedelta, timezone
+from functools import partial
 from typing import Any
 
-from sqlalchemy import func, select
+from sqlalchemy import case, func, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 
+from app.core.database import after_commit, after_rollback
+from app.core.redis import get_redis
 from app.models.user import User
 from app.models.xp_event import XPEvent, XPSource
 from app.models.streak import Streak, StreakType
-from app.services import sse_service
+from app.services import leaderboard_service, rollup_service, sse_service
 
 # --- XP values ---
 XP_VALUES: dict[XPSource, int] = {
@@ -49,25 +55,130 @@ def xp_for_level(level: int) -> int:
     return 20 * (level - 1) ** 2
 
 
+# _LEVEL_THRESHOLDS[i] is the XP needed for level i + 1
+_LEVEL_THRESHOLDS = [xp_for_level(level) for level in range(1, MAX_LEVEL + 1)]
+
+
 def compute_level(total_xp: int) -> int:
-    level = 1
-    while level < MAX_LEVEL and total_xp >= xp_for_level(level + 1):
-        level += 1
-    return level
+    return max(1, bisect_right(_LEVEL_THRESHOLDS, total_xp))
+
+
+def level_expression(xp_column):
+    """SQL CASE mirroring compute_level, for recomputing levels inside the database."""
+    return case(
+        *[(xp_column >= xp_for_level(level), level) for level in range(MAX_LEVEL, 1, -1)],
+        else_=1,
+    )
+
+
+async def relevel_users(db: AsyncSession, chunk_size: int = 10_000) -> list[int]:
+    """
+    Recompute `level` from `xp` for every user, one id range per UPDATE so each chunk
+    is a single set-based pass over users.xp. Returns the ids of users whose level changed.
+    """
+    max_id = (await db.execute(select(func.max(User.id)))).scalar_one_or_none() or 0
+    new_level = level_expression(User.xp)
+    changed: list[int] = []
+    for start in range(0, max_id + 1, chunk_size):
+        result = await db.execute(
+            update(User)
+            .where(User.id >= start, User.id < start + chunk_size, User.level != new_level)
+            .values(level=new_level)
+            .returning(User.id)
+            .execution_options(synchronize_session=False)
+        )
+        changed.extend(result.scalars())
+        await db.commit()
+    return changed
+
+
+def _today_bounds() -> tuple[datetime, datetime]:
+    start = datetime.combine(datetime.now(timezone.utc).date(), time.min, tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
 
 
 async def _count_today(db: AsyncSession, user_id: int, source: XPSource) -> int:
-    today_start = date.today()
+    # Plain range on created_at so ix_xp_events_user_source_created can be used
+    today_start, tomorrow_start = _today_bounds()
     result = await db.execute(
         select(func.count()).where(
             XPEvent.user_id == user_id,
             XPEvent.source == source,
-            func.date(XPEvent.created_at) == today_start,
+            XPEvent.created_at >= today_start,
+            XPEvent.created_at < tomorrow_start,
         )
     )
     return result.scalar_one()
 
 
+# INCRBY today's counter, creating a missing one from ARGV[2] (today's awards counted in
+# the DB) in the same step so a concurrent reservation can't skip the seed. Returns nil
+# when the counter is missing and no seed was passed.
+_RESERVE_DAILY = """
+if redis.call("exists", KEYS[1]) == 0 then
+    if ARGV[2] == "" then
+        return false
+    end
+    redis.call("set", KEYS[1], ARGV[2], "EXAT", ARGV[3])
+end
+return redis.call("incrby", KEYS[1], ARGV[1])
+"""
+
+
+async def _reserve_daily(db: AsyncSession, user_id: int, source: XPSource, requested: int, cap: int) -> int:
+    """
+    Reserve up to `requested` awards against today's cap for `source`. Returns how many fit.
+    Counts live in a Redis counter that expires at the day boundary; without Redis the
+    day's events are counted in the DB. A reservation is given back if the session's
+    transaction rolls back.
+    """
+    redis = await get_redis()
+    if redis is None:
+        count = await _count_today(db, user_id, source)
+        return max(0, min(requested, cap - count))
+
+    today_start, tomorrow_start = _today_bounds()
+    key = f"xp:daily:{user_id}:{source.value}:{today_start.date()}"
+    expires_at = int(tomorrow_start.timestamp())
+    total = await redis.eval(_RESERVE_DAILY, 1, key, requested, "", expires_at)
+    if total is None:
+        seed = await _count_today(db, user_id, source)
+        total = await redis.eval(_RESERVE_DAILY, 1, key, requested, seed, expires_at)
+
+    granted = max(0, min(requested, cap - (total - requested)))
+    if granted < requested:
+        await redis.decrby(key, requested - granted)
+    if granted:
+        after_rollback(db, partial(_release_daily, key, granted, expires_at))
+    return granted
+
+
+async def _release_daily(key: str, count: int, expires_at: int) -> None:
+    redis = await get_redis()
+    if redis is None:
+        return
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.decrby(key, count)
+        # After the day rolled over this recreates the counter already expired, i.e. drops it
+        pipe.expireat(key, expires_at)
+        await pipe.execute()
+
+
+def _base_xp(source: XPSource, meta: dict[str, Any] | None) -> int:
+    if source == XPSource.LEETCODE_SOLVE:
+        difficulty = (meta or {}).get("difficulty", "easy").lower()
+        return LEETCODE_XP.get(difficulty, 20)
+    if source == XPSource.GOAL_COMPLETE:
+        goal_kind = (meta or {}).get("kind", "custom")  # "daily" or "custom"
+        if goal_kind == "daily":
+            return GOAL_XP["daily"]
+        difficulty = (meta or {}).get("difficulty", 1)
+        return GOAL_DIFFICULTY_XP.get(difficulty, 20)
+    if source == XPSource.COMMIT:
+        return 10 + 2 * (meta or {}).get("files_changed", 0)
+    return XP_VALUES[source]
+
+
 async def award_xp(
     db: AsyncSession,
     user: User,
@@ -78,56 +189,106 @@ async def award_xp(
     Award XP to a user for a given source. Returns the XP awarded (0 if capped).
     Automatically applies streak multiplier for commits and updates user level.
     """
-    if source == XPSource.LEETCODE_SOLVE:
-        difficulty = (meta or {}).get("difficulty", "easy").lower()
-        base_xp = LEETCODE_XP.get(difficulty, 20)
-    elif source == XPSource.GOAL_COMPLETE:
-        goal_kind = (meta or {}).get("kind", "custom")  # "daily" or "custom"
-        if goal_kind == "daily":
-            base_xp = GOAL_XP["daily"]
-        else:
-            difficulty = (meta or {}).get("difficulty", 1)
-            base_xp = GOAL_DIFFICULTY_XP.get(difficulty, 20)
-    elif source == XPSource.COMMIT:
-        base_xp = 10 + 2 * (meta or {}).get("files_changed", 0)
-    else:
-        base_xp = XP_VALUES[source]
-
-    cap = DAILY_CAPS.get(source)
-    if cap is not None:
-        count_today = await _count_today(db, user.id, source)
-        if count_today >= cap:
-            return 0
+    awarded = await award_xp_batch(db, user, [(source, meta)])
+    return awarded[0]
 
-    if source == XPSource.COMMIT:
+
+async def award_xp_batch(
+    db: AsyncSession,
+    user: User,
+    items: list[tuple[XPSource, dict[str, Any] | None]],
+    meta: dict[str, Any] | None = None,
+) -> list[int]:
+    """
+    Award XP for several (source, meta) items at once. Returns the XP awarded per item.
+    The streak and daily cap counts are read once, all XPEvents are inserted in a single
+    statement and one aggregated `xp_gained` event is pushed once the caller commits.
+    `meta` overrides the meta sent over SSE; by default a single item's meta is forwarded as-is.
+    """
+    if not items:
+        return []
+
+    multiplier = 1.0
+    if any(source == XPSource.COMMIT for source, _ in items):
         streak = await _get_streak(db, user.id, StreakType.GITHUB)
         multiplier = streak_multiplier(streak)
-        awarded = int(base_xp * multiplier)
-    else:
-        awarded = base_xp
-        
-    event = XPEvent(user_id=user.id, source=source, amount=awarded, meta=meta)
-    db.add(event)
-
-    user.xp += awarded
-    new_level = compute_level(user.xp)
-    leveled_up = new_level > user.level
-    if leveled_up:
-        user.pending_level_up = True
-    user.level = new_level
-
-    await db.flush()  # populate event.id
-
-    delivered = await sse_service.push(user.id, "xp_gained", {
-        "amount": awarded,
-        "source": source.value,
+
+    # capped source -> awards still allowed today
+    allowance: dict[XPSource, int] = {}
+    requested = Counter(source for source, _ in items if DAILY_CAPS.get(source) is not None)
+    for source, count in requested.items():
+        allowance[source] = await _reserve_daily(db, user.id, source, count, DAILY_CAPS[source])
+
+    awarded: list[int] = []
+    rows: list[dict[str, Any]] = []
+    for source, item_meta in items:
+        if source in allowance:
+            if allowance[source] == 0:
+                awarded.append(0)
+                continue
+            allowance[source] -= 1
+
+        base_xp = _base_xp(source, item_meta)
+        amount = int(base_xp * multiplier) if source == XPSource.COMMIT else base_xp
+        awarded.append(amount)
+        rows.append({"user_id": user.id, "source": source, "amount": amount, "meta": item_meta})
+
+    if not rows:
+        return awarded
+
+    total = sum(awarded)
+    # Increment in SQL so concurrent awards for the same user can't lose updates
+    new_level = level_expression(User.xp + total)
+    result = await db.execute(
+        update(User)
+        .where(User.id == user.id)
+        .values(
+            xp=User.xp + total,
+            level=new_level,
+            pending_level_up=case((new_level > User.level, True), else_=User.pending_level_up),
+        )
+        .returning(User.xp, User.level, User.pending_level_up)
+        .execution_options(synchronize_session=False)
+    )
+    new_xp, level, pending_level_up = result.one()
+    leveled_up = level > compute_level(new_xp - total)
+    for key, value in (("xp", new_xp), ("level", level), ("pending_level_up", pending_level_up)):
+        set_committed_value(user, key, value)
+    user_id = user.id
+    amounts = [(row["source"], row["amount"]) for row in rows]
+    await rollup_service.record(db, user_id, amounts)
+    # A rolled-back (and later retried) award must not leave its XP on the boards
+    after_commit(db, partial(leaderboard_service.record_awards, user_id, amounts))
+
+    if meta is None and len(rows) == 1:
+        meta = rows[0]["meta"]
+
+    result = await db.execute(insert(XPEvent).returning(XPEvent.id), [{**row, "notified": False} for row in rows])
+    event_ids = list(result.scalars())
+    data = {
+        "amount": total,
+        "source": rows[0]["source"].value,
+        "count": len(rows),
         "level_up": leveled_up,
-        "new_level": user.level,
-        "total_xp": user.xp,
+        "new_level": level,
+        "total_xp": new_xp,
         "meta": meta,
-    })
-    event.notified = delivered  # mark as notified only if user was online
+        "event_ids": event_ids,  # WebSocket clients ack these
+    }
+
+    async def notify() -> None:
+        # mark as notified only if an SSE stream received it; sockets ack instead
+        if await sse_service.push(user_id, "xp_gained", data):
+            await db.execute(
+                update(XPEvent)
+                .where(XPEvent.user_id == user_id, XPEvent.id.in_(event_ids))
+                .values(notified=True)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
 
+    # Pushed once the events are committed, so an ack can't race the rows it marks
+    after_commit(db, notify)
     return awarded
 
 
@@ -0,0 +1,129 @@
+"""
+Micro-benchmark: how cached values are stored.
+
+Builds values the same shape and size as what the GitHub and LeetCode routes
+cache (the branch listing with eight commits per branch, a commit list, a commit
+detail, the repo list and a problem search), with deterministic fake content,
+and compares bytes stored and CPU per encode + decode for:
+
+- before: json.dumps text, as cache_set wrote it before codecs.
+- msgpack raw: the codec layer with compression off.
+- json / msgpack: the codec layer, compressing with zlib from COMPRESS_MIN_BYTES
+  (the defaults write bare json, until no pre-codec release is left running).
+
+    cd backend && python -m benchmarks.bench_cache_codecs
+"""
+import hashlib
+import json
+import random
+import time
+
+from app.core.config import settings
+from app.services.cache import decode_value, encode_value
+
+ROUNDS = 2_000
+COMPRESS_MIN_BYTES = 1024
+STALE_ENVELOPE_FRESH_UNTIL = 1_760_000_000.0
+
+rng = random.Random(7)
+WORDS = "fix add update refactor remove tests docs cache webhook streak goal parser api route model".split()
+
+
+def sha() -> str:
+    return hashlib.sha1(str(rng.random()).encode()).hexdigest()
+
+
+def commit() -> dict:
+    return {
+        "sha": sha(),
+        "message": " ".join(rng.choices(WORDS, k=rng.randint(3, 9))).capitalize(),
+        "date": f"2026-0{rng.randint(1, 9)}-{rng.randint(10, 28)}T{rng.randint(10, 23)}:04:05Z",
+        "author": rng.choice(["Ada Lovelace", "Grace Hopper", "Linus", "octocat"]),
+    }
+
+
+def envelope(value) -> dict:
+    return {"value": value, "fresh_until": STALE_ENVELOPE_FRESH_UNTIL}
+
+
+def branches() -> list[dict]:
+    out = []
+    for i in range(10):
+        commits = [commit() for _ in range(8)]
+        out.append({"name": f"feature/{rng.choice(WORDS)}-{i}", "sha": commits[0]["sha"], "date": commits[0]["date"], "commits": commits})
+    return out
+
+
+def commit_detail() -> dict:
+    files = [
+        {"filename": f"backend/app/{rng.choice(WORDS)}/{rng.choice(WORDS)}.py", "additions": rng.randint(0, 80),
+         "deletions": rng.randint(0, 40), "status": rng.choice(["modified", "added", "removed"])}
+        for _ in range(10)
+    ]
+    return {**commit(), "message": "Long message\n\n" + " ".join(rng.choices(WORDS, k=60)),
+            "additions": 412, "deletions": 130, "files": files}
+
+
+def repos() -> list[dict]:
+    return [
+        {"id": rng.randint(10**7, 10**9), "name": f"{rng.choice(WORDS)}-{i}", "full_name": f"octocat/{rng.choice(WORDS)}-{i}",
+         "description": " ".join(rng.choices(WORDS, k=12)), "language": rng.choice(["Python", "TypeScript", "Go"]),
+         "stargazers_count": rng.randint(0, 500), "updated_at": commit()["date"], "private": False}
+        for i in range(30)
+    ]
+
+
+def problems() -> list[dict]:
+    return [
+        {"title": f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {i}", "slug": f"{rng.choice(WORDS)}-{i}",
+         "difficulty": rng.choice(["Easy", "Medium", "Hard"]), "ac_rate": rng.random() * 100,
+         "topics": rng.choices(["Array", "Hash Table", "Graph", "Dynamic Programming"], k=3), "paid_only": False}
+        for i in range(50)
+    ]
+
+
+PAYLOADS = {
+    "branches": envelope(branches()),
+    "commits": envelope([commit() for _ in range(50)]),
+    "commit detail": commit_detail(),
+    "repos": envelope(repos()),
+    "leetcode search": problems(),
+}
+
+
+def measure(encode, decode, value) -> tuple[int, float]:
+    raw = encode(value)
+    assert decode(raw) == value
+    start = time.process_time()
+    for _ in range(ROUNDS):
+        decode(encode(value))
+    return len(raw), (time.process_time() - start) / ROUNDS
+
+
+def main() -> None:
+    min_bytes = COMPRESS_MIN_BYTES
+    variants = {  # name -> (CACHE_CODEC, CACHE_COMPRESS_MIN_BYTES), None for the old json.dumps
+        "before": None,
+        "msgpack raw": ("msgpack", 0),
+        "json": ("json", min_bytes),
+        "msgpack": ("msgpack", min_bytes),
+    }
+    print(f"per value: bytes stored, CPU per encode + decode (compress from {min_bytes} B)")
+    for name, value in PAYLOADS.items():
+        results = {}
+        for variant, config in variants.items():
+            if config is None:
+                results[variant] = measure(lambda v: json.dumps(v).encode(), json.loads, value)
+                continue
+            settings.CACHE_CODEC, settings.CACHE_COMPRESS_MIN_BYTES = config
+            results[variant] = measure(encode_value, decode_value, value)
+        size, _ = results["before"]
+        row = "  ".join(
+            f"{variant} {s:>5} B {c * 1e6:>5.0f} µs" for variant, (s, c) in results.items()
+        )
+        best = min(results.values())
+        print(f"  {name:<16} {row}   ({size / best[0]:.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Micro-benchmark: decoding GitHub push payloads.
+
+Compares the old webhook path (`request.json()` parsing the whole body into
+dicts, then walking them in handle_push) with the typed msgspec decoder that
+only materializes the fields PushEvent declares.
+
+    cd backend && python -m benchmarks.bench_push_decode
+"""
+import json
+import timeit
+
+import msgspec
+
+from app.schemas.webhook import PushEvent
+
+# Field layout follows GitHub's push event payload
+# https://docs.github.com/en/webhooks/webhook-events-and-payloads#push
+
+
+def _person(i: int) -> dict:
+    return {
+        "name": f"Dev {i}",
+        "email": f"dev{i}@users.noreply.github.com",
+        "username": f"dev{i}",
+        "date": "2026-10-17T09:15:00-07:00",
+    }
+
+
+def _commit(i: int, files_per_commit: int) -> dict:
+    paths = [f"services/pkg{i % 40}/src/module_{j}/handler_{j}.py" for j in range(files_per_commit)]
+    third = max(1, files_per_commit // 3)
+    return {
+        "id": f"{i:040x}",
+        "tree_id": f"{i + 1:040x}",
+        "distinct": True,
+        "message": f"feat(pkg{i % 40}): change {i}\n\n" + "Longer body describing the change. " * 8,
+        "timestamp": "2026-10-17T09:15:00-07:00",
+        "url": f"https://github.com/acme/monorepo/commit/{i:040x}",
+        "author": _person(i),
+        "committer": _person(i + 1),
+        "added": paths[:third],
+        "removed": paths[third:2 * third],
+        "modified": paths[2 * third:],
+    }
+
+
+def make_push_payload(commits: int = 20, files_per_commit: int = 6) -> bytes:
+    commit_list = [_commit(i, files_per_commit) for i in range(commits)]
+    owner = {
+        "login": "acme", "id": 1, "node_id": "MDQ6VXNlcjE=",
+        "avatar_url": "https://avatars.githubusercontent.com/u/1?v=4",
+        "html_url": "https://github.com/acme", "type": "Organization", "site_admin": False,
+    }
+    payload = {
+        "ref": "refs/heads/main",
+        "before": "0" * 40,
+        "after": commit_list[-1]["id"],
+        "repository": {
+            "id": 123456, "node_id": "R_kgDOA", "name": "monorepo", "full_name": "acme/monorepo",
+            "private": False, "owner": owner, "html_url": "https://github.com/acme/monorepo",
+            "description": "All the things", "fork": False,
+            **{f"{k}_url": f"https://api.github.com/repos/acme/monorepo/{k}" for k in (
+                "forks", "keys", "collaborators", "teams", "hooks", "issue_events", "events",
+                "assignees", "branches", "tags", "blobs", "git_tags", "git_refs", "trees",
+                "statuses", "languages", "stargazers", "contributors", "subscribers",
+                "subscription", "commits", "git_commits", "comments", "issue_comment",
+                "contents", "compare", "merges", "archive", "downloads", "issues", "pulls",
+                "milestones", "notifications", "labels", "releases", "deployments",
+            )},
+            "size": 90210, "stargazers_count": 42, "watchers_count": 42, "language": "Python",
+            "default_branch": "main", "topics": ["monorepo", "platform"],
+        },
+        "pusher": {"name": "dev0", "email": "dev0@users.noreply.github.com"},
+        "sender": owner,
+        "created": False, "deleted": False, "forced": False, "base_ref": None,
+        "compare": "https://github.com/acme/monorepo/compare/000000...fff",
+        "commits": commit_list,
+        "head_commit": commit_list[-1],
+    }
+    return json.dumps(payload).encode()
+
+
+def old_path(body: bytes) -> list[dict]:
+    data = json.loads(body)  # request.json() — builds the full dict tree, file lists and all
+    repo = data.get("repository", {}).get("full_name", "")
+    data.get("pusher", {}).get("name") or data.get("sender", {}).get("login")
+    out = []
+    for commit in data.get("commits", []):
+        added, removed, modified = commit.get("added", []), commit.get("removed", []), commit.get("modified", [])
+        out.append({"sha": commit.get("id"), "repo": repo, "files_changed": len(added) + len(removed) + len(modified)})
+    return out
+
+
+_decoder = msgspec.json.Decoder(PushEvent)
+
+
+def new_path(body: bytes) -> list[dict]:
+    event = _decoder.decode(body)
+    repo = event.repository.full_name
+    event.actor_login
+    return [{"sha": c.id, "repo": repo, "files_changed": c.files_changed} for c in event.commits]
+
+
+def run(label: str, body: bytes, number: int) -> None:
+    assert old_path(body) == new_path(body)
+    old = min(timeit.repeat(lambda: old_path(body), number=number, repeat=5)) / number
+    new = min(timeit.repeat(lambda: new_path(body), number=number, repeat=5)) / number
+    print(
+        f"{label:<34} {len(body) / 1024:>9.1f} KiB"
+        f"  dict path {old * 1e6:>10.1f} µs  typed {new * 1e6:>10.1f} µs  ({old / new:.2f}x)"
+    )
+
+
+if __name__ == "__main__":
+    run("20 commits, 6 files each", make_push_payload(20, 6), number=2000)
+    run("20 commits, 300 files each", make_push_payload(20, 300), number=100)
+    run("200 commits, 1000 files each", make_push_payload(200, 1000), number=3)
@@ -0,0 +1,103 @@
+"""
+Micro-benchmark: fanning one event out to many open SSE streams.
+
+Holds 10k simulated /events/stream consumers in one event loop and measures
+process CPU time per broadcast, from push until every stream has handed its
+frame to the (stubbed) socket.
+
+- before: the old stream loop, an unbounded asyncio.Queue per connection read
+  with asyncio.wait_for(q.get(), 25) (one timer armed and cancelled per event
+  per stream), json.dumps per stream and a str chunk that Starlette encodes
+  per stream.
+- after: ConnectionQueue + Event, where the frame is encoded once and the same
+  bytes are shared, and keepalives come from one shared heartbeat.
+
+    cd backend && python -m benchmarks.bench_sse_broadcast
+"""
+import asyncio
+import json
+import time
+
+from app.services.sse_service import ConnectionQueue, Event
+
+CONNECTIONS = 10_000
+BROADCASTS = 50
+KEEPALIVE_SECONDS = 25
+
+DATA = {
+    "amount": 35, "source": "commit", "count": 3, "level_up": False, "new_level": 7, "total_xp": 4210,
+    "meta": {"repo": "acme/monorepo", "commits": 3},
+}
+
+
+class Sink:
+    """Stands in for the ASGI send; counts what would have gone out."""
+
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.sent = 0
+        self.done = asyncio.Event()
+
+    def send(self, chunk: bytes) -> None:
+        self.sent += 1
+        if self.sent == self.expected:
+            self.done.set()
+
+
+async def old_stream(q: asyncio.Queue, sink: Sink) -> None:
+    while True:
+        try:
+            event = await asyncio.wait_for(q.get(), timeout=KEEPALIVE_SECONDS)
+            payload = json.dumps(event["data"])
+            sink.send(f"event: {event['type']}\ndata: {payload}\n\n".encode())
+        except asyncio.TimeoutError:
+            sink.send(b": keepalive\n\n")
+
+
+async def old_broadcast(queues: list[asyncio.Queue]) -> None:
+    event = {"type": "xp_gained", "data": DATA}
+    for q in queues:
+        await q.put(event)
+
+
+async def new_stream(q: ConnectionQueue, sink: Sink) -> None:
+    while (event := await q.get()) is not None:
+        sink.send(event.frame)
+
+
+async def new_broadcast(queues: list[ConnectionQueue]) -> None:
+    event = Event("xp_gained", DATA)
+    for q in queues:
+        q.offer(event)
+
+
+async def measure(make_queue, stream, broadcast) -> float:
+    queues = [make_queue() for _ in range(CONNECTIONS)]
+    sink = Sink(CONNECTIONS)
+    tasks = [asyncio.create_task(stream(q, sink)) for q in queues]
+    await asyncio.sleep(0)  # let every stream park on its queue
+
+    total = 0.0
+    for _ in range(BROADCASTS):
+        sink.sent, sink.done = 0, asyncio.Event()
+        start = time.process_time()
+        await broadcast(queues)
+        await sink.done.wait()
+        total += time.process_time() - start
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return total / BROADCASTS
+
+
+async def main() -> None:
+    before = await measure(asyncio.Queue, old_stream, old_broadcast)
+    after = await measure(lambda: ConnectionQueue(64), new_stream, new_broadcast)
+    print(f"{CONNECTIONS} connections, CPU per broadcast")
+    print(f"  before (wait_for + per-stream encode) {before * 1e3:>8.2f} ms")
+    print(f"  after  (shared heartbeat + frame)     {after * 1e3:>8.2f} ms  ({before / after:.2f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
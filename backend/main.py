@@ -3,9 +3,11 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.router import api_router
+from app.api.routes.webhooks import process_queued_delivery
 from app.core.config import settings
 from app.core.database import create_tables
 from app.core.redis import close_redis, init_redis
+from app.services import cache, sse_service, webhook_queue
 
 
 @asynccontextmanager
@@ -16,7 +18,13 @@ async def lifespan(app: FastAPI):
     if _is_sqlite:
         await create_tables()
     await init_redis()
+    await cache.start()
+    await sse_service.start()
+    await webhook_queue.start_workers(process_queued_delivery)
     yield
+    await webhook_queue.stop_workers()
+    await sse_service.stop()
+    await cache.stop()
     await close_redis()
 
 
@@ -42,3 +50,8 @@ app.include_router(api_router)
 async def health():
     return {"status": "ok"}
 
+
+@app.get("/health/sse")
+async def sse_health():
+    """Connection counts, queue depths and fan-out sizes for this process."""
+    return sse_service.stats()
@@ -0,0 +1,29 @@
+"""
+Monthly xp_events maintenance (Postgres): create upcoming partitions and archive
+partitions older than XP_ARCHIVE_HORIZON_MONTHS to gzipped NDJSON, keeping their rollups.
+
+    cd backend && python -m scripts.archive_xp_events [--horizon-months 12] [--archive-dir archive/xp_events]
+"""
+import argparse
+import asyncio
+from pathlib import Path
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.services import partition_service
+
+
+async def main(horizon_months: int, archive_dir: Path) -> None:
+    async with AsyncSessionLocal() as db:
+        for month in await partition_service.ensure_partitions(db):
+            print(f"Created partition {partition_service.partition_name(month)}")
+        for path in await partition_service.archive_older_than(db, horizon_months, archive_dir):
+            print(f"Archived to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--horizon-months", type=int, default=settings.XP_ARCHIVE_HORIZON_MONTHS)
+    parser.add_argument("--archive-dir", type=Path, default=Path(settings.XP_ARCHIVE_DIR))
+    args = parser.parse_args()
+    asyncio.run(main(args.horizon_months, args.archive_dir))
@@ -0,0 +1,23 @@
+"""
+Rebuild xp_daily_rollups from the xp_events ledger. Days already archived out of
+the ledger keep the rollups written when their partition was archived.
+
+    cd backend && python -m scripts.backfill_rollups
+"""
+import asyncio
+import time
+
+from app.core.database import AsyncSessionLocal
+from app.services import partition_service, rollup_service
+
+
+async def main() -> None:
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        since = await partition_service.retained_since(db)
+        written = await rollup_service.rebuild(db, since)
+    print(f"Wrote {written} rollup rows in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
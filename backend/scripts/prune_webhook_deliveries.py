@@ -0,0 +1,25 @@
+"""
+Delete webhook_deliveries records older than WEBHOOK_DELIVERY_TTL, past which GitHub no longer redelivers.
+
+    cd backend && python -m scripts.prune_webhook_deliveries [--older-than-hours 72]
+"""
+import argparse
+import asyncio
+from datetime import timedelta
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.services import delivery_store
+
+
+async def main(older_than: timedelta) -> None:
+    async with AsyncSessionLocal() as db:
+        removed = await delivery_store.prune(db, older_than)
+    print(f"Pruned {removed} webhook deliveries")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--older-than-hours", type=int, default=settings.WEBHOOK_DELIVERY_TTL // 3600)
+    args = parser.parse_args()
+    asyncio.run(main(timedelta(hours=args.older_than_hours)))
@@ -0,0 +1,42 @@
+"""
+Repopulate the Redis leaderboards from the xp_events ledger and archived rollups.
+
+Refuses to run if XP was awarded within --quiet-seconds: awards that race the final
+swap can be missed or counted twice (see leaderboard_service.rebuild).
+
+    cd backend && python -m scripts.rebuild_leaderboards [--quiet-seconds 60] [--force]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+
+from app.core.database import AsyncSessionLocal
+from app.core.redis import close_redis, init_redis
+from app.models.xp_event import XPEvent
+from app.services import leaderboard_service, partition_service
+
+
+async def main(quiet: timedelta, force: bool) -> None:
+    async with AsyncSessionLocal() as db:
+        last_award = (await db.execute(select(func.max(XPEvent.created_at)))).scalar()
+        if not force and last_award is not None and last_award > datetime.now(timezone.utc) - quiet:
+            sys.exit(f"XP was awarded at {last_award:%H:%M:%S}; rerun when awards are quiet, or pass --force")
+
+        await init_redis()
+        started = time.perf_counter()
+        since = await partition_service.retained_since(db)
+        ranked = await leaderboard_service.rebuild(db, since)
+    await close_redis()
+    print(f"Rebuilt leaderboards for {ranked} users in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--quiet-seconds", type=int, default=60)
+    parser.add_argument("--force", action="store_true", help="rebuild even while XP is being awarded")
+    args = parser.parse_args()
+    asyncio.run(main(timedelta(seconds=args.quiet_seconds), args.force))
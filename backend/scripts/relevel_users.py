@@ -0,0 +1,30 @@
+"""
+Recompute every user's level from their XP, e.g. after changing MAX_LEVEL or the level curve.
+
+    cd backend && python -m scripts.relevel_users [--chunk-size 10000]
+"""
+import argparse
+import asyncio
+import time
+
+from app.core.database import AsyncSessionLocal
+from app.core.redis import close_redis, init_redis
+from app.services.cache import cache_delete_many
+from app.services.xp_service import relevel_users
+
+
+async def main(chunk_size: int) -> None:
+    await init_redis()
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        changed = await relevel_users(db, chunk_size=chunk_size)
+    await cache_delete_many(f"user:me:{user_id}" for user_id in changed)
+    await close_redis()
+    print(f"Re-levelled {len(changed)} users in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.chunk_size))
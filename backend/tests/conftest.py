@@ -3,21 +3,28 @@ import pytest_asyncio
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
-from app.core.database import Base, get_db
+from app.core.database import AppSession, Base, get_db
 from app.core.redis import get_redis
 from app.core.security import create_access_token
 from app.models.user import User
+from app.services import cache, login_cache
 
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
 
+@pytest.fixture(autouse=True)
+def clear_local_caches():
+    login_cache._local.clear()
+    cache._local.clear()
+
+
 @pytest_asyncio.fixture(scope="function")
 async def db():
     engine = create_async_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
-    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    session_factory = async_sessionmaker(engine, class_=AppSession, expire_on_commit=False)
     async with session_factory() as session:
         yield session
 
@@ -28,7 +35,7 @@ async def db():
 
 @pytest_asyncio.fixture(scope="function")
 async def user(db: AsyncSession) -> User:
-    u = User(github_id="test123", username="testuser", xp=0, level=1, pending_level_up=False)
+    u = User(github_id="test123", github_login="testuser", username="testuser", xp=0, level=1, pending_level_up=False)
     db.add(u)
     await db.commit()
     await db.refresh(u)
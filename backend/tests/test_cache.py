@@ -0,0 +1,383 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.services import cache
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def execute_command(self, command, key, NEVER_DECODE=False):
+        assert (command, NEVER_DECODE) == ("GET", True)
+        self.calls.append(self.redis.get_bytes(key))
+
+    def pttl(self, key):
+        self.calls.append(self.redis.pttl(key))
+
+    def set(self, key, value, ex=None):
+        self.calls.append(self.redis.set(key, value, ex=ex))
+
+    def sadd(self, key, member):
+        self.calls.append(self.redis.sadd(key, member))
+
+    def expire(self, key, seconds, nx=False, gt=False):
+        self.calls.append(self.redis.expire(key, seconds, nx=nx, gt=gt))
+
+    def smembers(self, key):
+        self.calls.append(self.redis.smembers(key))
+
+    def delete(self, *keys):
+        self.calls.append(self.redis.delete(*keys))
+
+    async def execute(self):
+        return [await call for call in self.calls]
+
+
+class FakePubSub:
+    def __init__(self):
+        self.messages: asyncio.Queue = asyncio.Queue()
+
+    async def subscribe(self, *channels):
+        pass
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=None):
+        try:
+            return await asyncio.wait_for(self.messages.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        pass
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data: dict[str, str] = {}
+        self.sets: dict[str, set[str]] = {}
+        self.ttls: dict[str, int] = {}
+        self.gets = 0
+        self.published: list[dict] = []
+        self.pubsub_conn = FakePubSub()
+
+    async def get(self, key):
+        self.gets += 1
+        return self.data.get(key)
+
+    async def get_bytes(self, key):
+        value = await self.get(key)
+        return value.encode() if isinstance(value, str) else value
+
+    async def pttl(self, key):
+        return 60_000 if key in self.data else -2
+
+    async def set(self, key, value, ex=None, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, token):
+        if self.data.get(key) == token:
+            del self.data[key]
+            return 1
+        return 0
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+            self.sets.pop(key, None)
+
+    async def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(member)
+
+    async def smembers(self, key):
+        return set(self.sets.get(key, ()))
+
+    async def expire(self, key, seconds, nx=False, gt=False):
+        current = self.ttls.get(key)
+        if (nx and current is not None) or (gt and (current is None or seconds <= current)):
+            return False
+        self.ttls[key] = seconds
+        return True
+
+    async def publish(self, channel, message):
+        self.published.append(json.loads(message))
+        return 1
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def pubsub(self):
+        return self.pubsub_conn
+
+
+@pytest.fixture
+async def redis(monkeypatch):
+    fake = FakeRedis()
+
+    async def fake_get_redis():
+        return fake
+
+    monkeypatch.setattr(cache, "get_redis", fake_get_redis)
+    await cache.start()
+    yield fake
+    await cache.stop()
+
+
+@pytest.mark.asyncio
+async def test_hot_keys_served_from_local_tier(redis):
+    redis.data["user:me:1"] = json.dumps({"xp": 10})
+
+    assert await cache.cache_get("user:me:1") == {"xp": 10}
+    assert await cache.cache_get("user:me:1") == {"xp": 10}
+    assert redis.gets == 1
+
+
+@pytest.mark.asyncio
+async def test_writes_and_deletes_broadcast_invalidations(redis):
+    await cache.cache_set("user:me:1", {"xp": 10})
+    assert await cache.cache_get("user:me:1") == {"xp": 10}
+    assert redis.gets == 0
+
+    await cache.cache_delete("user:me:1")
+    assert await cache.cache_get("user:me:1") is None
+    assert [m["keys"] for m in redis.published] == [["user:me:1"], ["user:me:1"]]
+
+
+@pytest.mark.asyncio
+async def test_cache_delete_many_batches_deletes_and_broadcasts(redis, monkeypatch):
+    keys = [f"user:me:{i}" for i in range(2_500)]
+    redis.data.update({key: "1" for key in keys})
+    deletes = []
+    real_delete = redis.delete
+
+    async def counting_delete(*keys):
+        deletes.append(len(keys))
+        await real_delete(*keys)
+
+    monkeypatch.setattr(redis, "delete", counting_delete)
+    await cache.cache_delete_many(iter(keys))
+
+    assert redis.data == {}
+    assert deletes == [1_000, 1_000, 500]
+    assert [len(m["keys"]) for m in redis.published] == [1_000, 1_000, 500]
+
+
+@pytest.mark.asyncio
+async def test_invalidations_from_other_workers_drop_local_copies(redis):
+    redis.data.update({"user:me:1": "1", "github:repos:1": "2", "github:repos:2": "3"})
+    for key in redis.data:
+        await cache.cache_get(key)
+
+    await redis.pubsub_conn.messages.put({"data": json.dumps({"origin": "other", "keys": ["user:me:1"]})})
+    await redis.pubsub_conn.messages.put({"data": json.dumps({"origin": "other", "keys": ["github:repos:1"]})})
+    await asyncio.sleep(0.01)
+    assert list(cache._local) == ["github:repos:2"]
+
+
+@pytest.mark.asyncio
+async def test_read_racing_an_invalidation_is_not_kept(redis, monkeypatch):
+    redis.data["user:me:1"] = "1"
+    real_get = redis.get
+
+    async def get_then_invalidated(key):
+        value = await real_get(key)
+        cache._local_drop([key])  # another worker's write lands mid-read
+        return value
+
+    monkeypatch.setattr(redis, "get", get_then_invalidated)
+    assert await cache.cache_get("user:me:1") == 1
+    assert "user:me:1" not in cache._local
+
+
+@pytest.mark.asyncio
+async def test_get_or_compute_coalesces_concurrent_misses(redis):
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return [{"id": 1}]
+
+    results = await asyncio.gather(*(cache.get_or_compute("github:repos:1", 60, loader) for _ in range(5)))
+    assert results == [[{"id": 1}]] * 5
+    assert calls == 1
+    assert cache.decode_value(redis.data["github:repos:1"]) == [{"id": 1}]
+    assert "lock:github:repos:1" not in redis.data
+    assert cache._inflight == {}
+
+
+@pytest.mark.asyncio
+async def test_get_or_compute_waits_for_another_process(redis, monkeypatch):
+    monkeypatch.setattr(cache, "LOCK_POLL", 0.005)
+    redis.data["lock:leetcode:search:two sum"] = "other-process"
+
+    async def other_process_finishes():
+        await asyncio.sleep(0.02)
+        redis.data["leetcode:search:two sum"] = json.dumps([{"slug": "two-sum"}])
+
+    async def loader():
+        raise AssertionError("loader should not run while another process holds the lock")
+
+    asyncio.create_task(other_process_finishes())
+    assert await cache.get_or_compute("leetcode:search:two sum", 60, loader) == [{"slug": "two-sum"}]
+
+
+@pytest.mark.asyncio
+async def test_get_or_compute_shares_loader_errors(redis):
+    async def loader():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("GitHub is down")
+
+    results = await asyncio.gather(
+        *(cache.get_or_compute("github:repos:1", 60, loader) for _ in range(3)), return_exceptions=True
+    )
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert redis.data == {}
+    assert cache._inflight == {}
+
+
+@pytest.mark.asyncio
+async def test_stale_value_served_while_refreshing(redis):
+    redis.data["github:repos:1"] = json.dumps({"value": ["old"], "fresh_until": 0})
+    refreshed = asyncio.Event()
+
+    async def loader():
+        await asyncio.sleep(0.01)
+        refreshed.set()
+        return ["new"]
+
+    assert await cache.get_or_compute("github:repos:1", 60, loader, stale_ttl=600) == ["old"]
+    assert await cache.get_or_compute("github:repos:1", 60, loader, stale_ttl=600) == ["old"]
+    await asyncio.wait_for(refreshed.wait(), 1)
+    await asyncio.sleep(0)
+
+    assert await cache.get_or_compute("github:repos:1", 60, loader, stale_ttl=600) == ["new"]
+    assert cache.decode_value(redis.data["github:repos:1"])["fresh_until"] > 0
+    assert cache._refreshing == {}
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_keeps_serving_stale(redis):
+    redis.data["github:repos:1"] = json.dumps({"value": ["old"], "fresh_until": 0})
+
+    async def loader():
+        raise RuntimeError("GitHub is slow today")
+
+    assert await cache.get_or_compute("github:repos:1", 60, loader, stale_ttl=600) == ["old"]
+    await asyncio.sleep(0.01)
+    assert await cache.get_or_compute("github:repos:1", 60, loader, stale_ttl=600) == ["old"]
+    assert "lock:github:repos:1" not in redis.data
+
+
+@pytest.mark.asyncio
+async def test_entry_without_envelope_is_reloaded(redis):
+    redis.data["github:repos:1"] = json.dumps(["legacy"])
+
+    async def loader():
+        return ["fresh"]
+
+    assert await cache.get_or_compute("github:repos:1", 60, loader, stale_ttl=600) == ["fresh"]
+
+
+def test_enveloped_github_keys_are_versioned():
+    from app.services.github_service import cache_key
+
+    # Older releases read github:repos:1 as a bare list; envelopes must not land there
+    assert cache_key("repos", 1) == "github:repos:v2:1"
+    assert cache_key("branches", 1, "shepherd") == "github:branches:v2:1:shepherd"
+
+
+@pytest.mark.asyncio
+async def test_waiter_skips_entry_without_envelope(redis, monkeypatch):
+    monkeypatch.setattr(cache, "LOCK_POLL", 0.005)
+    redis.data["github:repos:1"] = json.dumps(["legacy"])
+    redis.data["lock:github:repos:1"] = "other-process"
+
+    async def other_process_finishes():
+        await asyncio.sleep(0.02)
+        redis.data["github:repos:1"] = json.dumps({"value": ["fresh"], "fresh_until": time.time() + 60})
+        await redis.pubsub_conn.messages.put({"data": json.dumps({"origin": "other", "keys": ["github:repos:1"]})})
+
+    async def loader():
+        raise AssertionError("loader should not run while another process holds the lock")
+
+    asyncio.create_task(other_process_finishes())
+    assert await cache.get_or_compute("github:repos:1", 60, loader, stale_ttl=3600) == ["fresh"]
+
+
+@pytest.mark.asyncio
+async def test_invalidate_tag_deletes_only_tagged_keys(redis):
+    await cache.cache_set("github:commits:1:api", ["a"], 60, tags=["github:repo:ada/api"])
+    await cache.cache_set("github:branches:1:api", ["main"], 600, tags=["github:repo:ada/api"])
+    await cache.cache_set("github:commits:1:web", ["b"], 60, tags=["github:repo:ada/web"])
+    assert redis.ttls["tag:github:repo:ada/api"] == 600
+
+    await cache.invalidate_tag("github:repo:ada/api")
+    assert set(redis.data) == {"github:commits:1:web"}
+    assert set(redis.sets) == {"tag:github:repo:ada/web"}
+    assert await cache.cache_get("github:commits:1:api") is None
+    assert sorted(redis.published[-1]["keys"]) == ["github:branches:1:api", "github:commits:1:api"]
+
+    published = len(redis.published)
+    await cache.invalidate_tag("github:repo:ada/api")
+    assert len(redis.published) == published
+
+
+@pytest.mark.asyncio
+async def test_get_or_compute_tags_what_it_stores(redis):
+    async def loader():
+        return {"sha": "abc"}
+
+    await cache.get_or_compute("github:repo:ada/api:commit:abc:1", 60, loader, tags=["github:repo:ada/api"])
+    assert redis.sets["tag:github:repo:ada/api"] == {"github:repo:ada/api:commit:abc:1"}
+
+
+BRANCHES = [
+    {"name": f"feature-{i}", "sha": "a" * 40, "date": "2026-01-01T00:00:00Z",
+     "commits": [{"sha": "b" * 40, "message": "Fix the thing", "author": "Ada"}] * 8}
+    for i in range(10)
+]
+
+
+@pytest.mark.parametrize("codec", ["json", "msgpack"])
+def test_codecs_round_trip_and_compress_large_values(monkeypatch, codec):
+    monkeypatch.setattr(cache.settings, "CACHE_CODEC", codec)
+    monkeypatch.setattr(cache.settings, "CACHE_COMPRESS_MIN_BYTES", 1024)
+    small = cache.encode_value({"xp": 10})
+    large = cache.encode_value(BRANCHES)
+
+    assert cache.decode_value(small) == {"xp": 10}
+    assert cache.decode_value(large) == BRANCHES
+    assert large[:2] == bytes((cache.CODEC_VERSION, cache._CODECS[codec][0] | cache._COMPRESSED))
+    assert len(large) < len(json.dumps(BRANCHES)) / 4
+    if codec == "json":
+        assert json.loads(small) == {"xp": 10}  # still readable by releases without codecs
+
+
+def test_default_settings_stay_readable_by_older_releases():
+    # Older pods read with decode_responses=True and json.loads
+    assert json.loads(cache.encode_value(BRANCHES).decode()) == BRANCHES
+
+
+def test_legacy_json_entries_still_read():
+    assert cache.decode_value(json.dumps({"value": [1], "fresh_until": 0.5}).encode()) == {"value": [1], "fresh_until": 0.5}
+    assert cache.decode_value(b'"1"') == "1"
+
+
+@pytest.mark.asyncio
+async def test_unknown_codec_is_a_miss(redis):
+    redis.data["user:me:1"] = bytes((cache.CODEC_VERSION + 1, 0)) + b"{}"
+    assert await cache.cache_get("user:me:1") is None
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.xp_event import XPEvent, XPSource
+from app.services import sse_service
+
+
+@pytest.mark.asyncio
+async def test_history_pages_by_keyset(client, db, user, auth_headers):
+    base = datetime(2026, 1, 1, 12, 0, 0)
+    for i in range(5):
+        db.add(XPEvent(
+            user_id=user.id,
+            source=XPSource.COMMIT if i % 2 == 0 else XPSource.LEETCODE_SOLVE,
+            amount=10 + i,
+            meta={"i": i},
+            created_at=base + timedelta(minutes=i // 2),  # ties broken by id
+        ))
+    await db.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = await client.get("/api/events/history", params=params, headers=auth_headers)
+        assert response.status_code == 200
+        page = response.json()
+        assert all("meta" not in item for item in page["items"])
+        seen.extend(item["amount"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == [14, 13, 12, 11, 10]
+
+
+@pytest.mark.asyncio
+async def test_history_filters_and_meta(client, db, user, auth_headers):
+    db.add(XPEvent(user_id=user.id, source=XPSource.COMMIT, amount=10, meta={"repo": "a/b"}))
+    db.add(XPEvent(user_id=user.id, source=XPSource.LEETCODE_SOLVE, amount=20, meta={"difficulty": "easy"}))
+    await db.commit()
+
+    response = await client.get(
+        "/api/events/history",
+        params={"source": "commit", "include_meta": True},
+        headers=auth_headers,
+    )
+    items = response.json()["items"]
+    assert [(i["amount"], i["meta"]) for i in items] == [(10, {"repo": "a/b"})]
+
+
+@pytest.mark.asyncio
+async def test_history_rejects_bad_cursor(client, user, auth_headers):
+    response = await client.get("/api/events/history", params={"cursor": "!!!"}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_stream_refused_over_connection_limit(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(sse_service.settings, "SSE_MAX_CONNECTIONS_PER_USER", 0)
+    client.cookies.set("auth_token", auth_headers["Authorization"].removeprefix("Bearer "))
+    response = await client.get("/api/events/stream")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(sse_service.settings.SSE_RETRY_AFTER_SECONDS)
+
+
+@pytest.mark.asyncio
+async def test_socket_ack_marks_only_own_events(db, user):
+    from app.api.routes.events import _mark_notified
+    from app.models.user import User
+
+    other = User(github_id="ack-2", github_login="other", username="other", xp=0, level=1)
+    db.add(other)
+    await db.flush()
+    mine = XPEvent(user_id=user.id, source=XPSource.COMMIT, amount=10, notified=False)
+    theirs = XPEvent(user_id=other.id, source=XPSource.COMMIT, amount=10, notified=False)
+    db.add_all([mine, theirs])
+    await db.commit()
+
+    await _mark_notified(db, user.id, [mine.id, theirs.id])
+    await db.refresh(mine)
+    await db.refresh(theirs)
+    assert mine.notified and not theirs.notified
@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models.user import User
+from app.models.xp_event import XPEvent, XPSource
+from app.models.xp_rollup import XPDailyRollup
+from app.services import leaderboard_service
+from app.services.xp_service import award_xp_batch
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_unknown_board(client, user, auth_headers):
+    response = await client.get("/api/leaderboard/nope", headers=auth_headers)
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_top_attaches_profiles(client, db, user, auth_headers, monkeypatch):
+    other = User(github_id="lb-2", github_login="rival", username="rival", xp=0, level=1)
+    db.add(other)
+    await db.commit()
+
+    async def fake_top(board, limit):
+        assert board == "week"
+        return [
+            {"rank": 1, "user_id": other.id, "xp": 300},
+            {"rank": 2, "user_id": 9999, "xp": 200},  # deleted account
+            {"rank": 3, "user_id": user.id, "xp": 100},
+        ]
+
+    monkeypatch.setattr(leaderboard_service, "top", fake_top)
+
+    response = await client.get("/api/leaderboard/week?limit=3", headers=auth_headers)
+    assert response.status_code == 200
+    assert [(e["rank"], e["username"]) for e in response.json()] == [(1, "rival"), (3, "testuser")]
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_my_rank(client, user, auth_headers, monkeypatch):
+    async def fake_rank(board, user_id, radius):
+        return 4, 120, [{"rank": 4, "user_id": user_id, "xp": 120}]
+
+    monkeypatch.setattr(leaderboard_service, "rank", fake_rank)
+
+    response = await client.get("/api/leaderboard/commit/me", headers=auth_headers)
+    data = response.json()
+    assert data["rank"] == 4
+    assert data["xp"] == 120
+    assert data["neighbours"][0]["username"] == "testuser"
+
+
+@pytest.mark.asyncio
+async def test_awards_reach_boards_only_after_commit(db, user, monkeypatch):
+    recorded = []
+
+    async def fake_record_awards(user_id, amounts):
+        recorded.append((user_id, amounts))
+
+    monkeypatch.setattr(leaderboard_service, "record_awards", fake_record_awards)
+    item = (XPSource.COMMIT, {"sha": "1", "repo": "a/b", "files_changed": 0})
+
+    await award_xp_batch(db, user, [item])
+    await db.rollback()  # e.g. handle_push failed after awarding; the retry awards again
+    await db.refresh(user)
+    await award_xp_batch(db, user, [item])
+    assert recorded == []
+
+    await db.commit()
+    assert recorded == [(user.id, [(XPSource.COMMIT, 10)])]
+
+
+class FakeBoardPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def delete(self, key):
+        self.ops.append(lambda boards: boards.pop(key, None))
+
+    def zadd(self, key, mapping):
+        self.ops.append(lambda boards: boards.setdefault(key, {}).update(mapping))
+
+    def zincrby(self, key, amount, member):
+        self.ops.append(lambda boards: boards.setdefault(key, {}).__setitem__(member, boards[key].get(member, 0) + amount))
+
+    def rename(self, src, dst):
+        self.ops.append(lambda boards: boards.__setitem__(dst, boards.pop(src)))
+
+    def expire(self, key, seconds):
+        pass
+
+    async def execute(self):
+        if self.redis.on_execute:
+            await self.redis.on_execute.pop()()
+        for op in self.ops:
+            op(self.redis.boards)
+
+
+class FakeBoardRedis:
+    def __init__(self):
+        self.boards = {}
+        self.on_execute = []  # one-shot hooks, run before the next pipeline executes
+
+    def pipeline(self, transaction=True):
+        return FakeBoardPipeline(self)
+
+
+@pytest.mark.asyncio
+async def test_rebuild_adds_archived_rollups_to_live_events(db, user, monkeypatch):
+    redis = FakeBoardRedis()
+
+    async def fake_get_redis():
+        return redis
+
+    monkeypatch.setattr(leaderboard_service, "get_redis", fake_get_redis)
+    now = datetime.now(timezone.utc)
+    since = (now - timedelta(days=60)).date().replace(day=1)
+    # Archived: only the rollup is left. Live: the event and its rollup.
+    db.add(XPDailyRollup(user_id=user.id, day=since - timedelta(days=3), source="commit", amount=40, count=4))
+    db.add(XPDailyRollup(user_id=user.id, day=now.date(), source="commit", amount=15, count=1))
+    db.add(XPEvent(user_id=user.id, source="commit", amount=15, created_at=now))
+    await db.commit()
+
+    assert await leaderboard_service.rebuild(db, since) == 1
+    assert redis.boards[leaderboard_service.board_key("all")] == {user.id: 55}
+    assert redis.boards[leaderboard_service.board_key("commit")] == {user.id: 55}
+    assert redis.boards[leaderboard_service.board_key("week")] == {user.id: 15}
+
+    # Without archived months the live ledger is the whole story
+    assert await leaderboard_service.rebuild(db) == 1
+    assert redis.boards[leaderboard_service.board_key("all")] == {user.id: 15}
+
+
+@pytest.mark.asyncio
+async def test_rebuild_keeps_awards_made_while_it_runs(db, user, monkeypatch):
+    redis = FakeBoardRedis()
+
+    async def fake_get_redis():
+        return redis
+
+    monkeypatch.setattr(leaderboard_service, "get_redis", fake_get_redis)
+    db.add(XPEvent(user_id=user.id, source="commit", amount=10))
+    await db.commit()
+    user_id = user.id
+
+    async def award_lands_mid_rebuild():
+        # Committed after the ledger read; its ZINCRBY hits the live board the swap replaces
+        db.add(XPEvent(user_id=user_id, source="leetcode_solve", amount=30))
+        await db.flush()
+        redis.boards.setdefault(leaderboard_service.board_key("all"), {})[user_id] = 999
+
+    redis.on_execute.append(award_lands_mid_rebuild)
+    assert await leaderboard_service.rebuild(db) == 1
+    assert redis.boards[leaderboard_service.board_key("all")] == {user_id: 40}
+    assert redis.boards[leaderboard_service.board_key("leetcode_solve")] == {user_id: 30}
+    assert redis.boards[leaderboard_service.board_key("week")] == {user_id: 40}
+    assert not any(key.endswith(":rebuild") for key in redis.boards)
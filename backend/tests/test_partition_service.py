@@ -0,0 +1,119 @@
+import gzip
+import json
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.sql.elements import TextClause
+
+from app.models.xp_event import XPEvent
+from app.models.xp_rollup import XPDailyRollup
+from app.services import partition_service
+
+
+@pytest.fixture
+def ddl(db, monkeypatch):
+    """Record the partitioning DDL sqlite can't run; every other statement goes through."""
+    issued = []
+    execute = db.execute
+
+    async def fake_execute(statement, *args, **kwargs):
+        if isinstance(statement, TextClause) and statement.text.startswith(("ALTER", "CREATE", "DROP")):
+            issued.append(statement.text)
+            return None
+        return await execute(statement, *args, **kwargs)
+
+    monkeypatch.setattr(db, "execute", fake_execute)
+    return issued
+
+
+def test_add_months_rolls_over_years():
+    assert partition_service._add_months(date(2026, 11, 1), 1) == date(2026, 12, 1)
+    assert partition_service._add_months(date(2026, 12, 1), 1) == date(2027, 1, 1)
+    assert partition_service._add_months(date(2026, 1, 1), -13) == date(2024, 12, 1)
+
+
+def test_partition_name():
+    assert partition_service.partition_name(date(2026, 3, 1)) == "xp_events_p202603"
+
+
+def test_is_partition():
+    assert partition_service.is_partition("xp_events_p202603")
+    assert partition_service.is_partition("xp_events_default")
+    assert not partition_service.is_partition("xp_events")
+    assert not partition_service.is_partition("xp_events_p2026")
+
+
+@pytest.mark.asyncio
+async def test_partition_maintenance_is_noop_off_postgres(db, tmp_path):
+    assert await partition_service.ensure_partitions(db) == []
+    assert await partition_service.archive_older_than(db, 12, tmp_path) == []
+    assert await partition_service.retained_since(db) is None
+
+
+@pytest.mark.asyncio
+async def test_create_partition_uses_utc_bounds(db, ddl):
+    conn = await db.connection()
+    await conn.execute(text("CREATE TABLE xp_events_default AS SELECT * FROM xp_events WHERE 0"))
+
+    await partition_service.create_partition(db, date(2026, 4, 1))
+
+    assert ddl == [
+        "CREATE TABLE IF NOT EXISTS xp_events_p202604 PARTITION OF xp_events "
+        "FOR VALUES FROM ('2026-04-01 00:00:00+00') TO ('2026-05-01 00:00:00+00')"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_create_partition_moves_stranded_default_rows(db, user, ddl):
+    conn = await db.connection()
+    await conn.execute(text("CREATE TABLE xp_events_default AS SELECT * FROM xp_events WHERE 0"))
+    await conn.execute(text(
+        "INSERT INTO xp_events_default (id, user_id, source, amount, notified, created_at) VALUES "
+        "(1, :user_id, 'commit', 10, 1, '2026-04-15 10:00:00.000000'), "
+        "(2, :user_id, 'commit', 10, 1, '2026-05-02 10:00:00.000000')"
+    ), {"user_id": user.id})
+
+    await partition_service.create_partition(db, date(2026, 4, 1))
+
+    assert [statement.split(" PARTITION")[0] for statement in ddl] == [
+        "ALTER TABLE xp_events DETACH",
+        "CREATE TABLE IF NOT EXISTS xp_events_p202604",
+        "ALTER TABLE xp_events ATTACH",
+    ]
+    moved = (await db.execute(select(XPEvent.id))).scalars().all()
+    left = (await db.execute(text("SELECT id FROM xp_events_default"))).scalars().all()
+    assert (moved, left) == ([1], [2])
+
+
+@pytest.mark.asyncio
+async def test_archive_partition_writes_file_then_refreshes_rollups(db, user, ddl, tmp_path):
+    user_id = user.id
+    db.add_all([
+        XPEvent(user_id=user_id, source="commit", amount=10, created_at=datetime(2026, 4, 1, 0, 5, tzinfo=timezone.utc)),
+        XPEvent(user_id=user_id, source="commit", amount=5, created_at=datetime(2026, 4, 30, 23, 55, tzinfo=timezone.utc)),
+        XPEvent(user_id=user_id, source="commit", amount=7, created_at=datetime(2026, 5, 1, 0, 0, tzinfo=timezone.utc)),
+        # Drifted rollup for the month being archived; the next month's is left alone
+        XPDailyRollup(user_id=user_id, day=date(2026, 4, 1), source="commit", amount=99, count=9),
+        XPDailyRollup(user_id=user_id, day=date(2026, 5, 1), source="commit", amount=7, count=1),
+    ])
+    await db.commit()
+
+    path = await partition_service.archive_partition(db, date(2026, 4, 1), tmp_path)
+
+    assert path == tmp_path / "xp_events_p202604.ndjson.gz"
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        archived = [json.loads(line) for line in f]
+    assert [row["amount"] for row in archived] == [10, 5]
+
+    db.expire_all()
+    rollups = (await db.execute(select(XPDailyRollup).order_by(XPDailyRollup.day))).scalars().all()
+    assert [(r.day, r.amount, r.count) for r in rollups] == [
+        (date(2026, 4, 1), 10, 1),
+        (date(2026, 4, 30), 5, 1),
+        (date(2026, 5, 1), 7, 1),
+    ]
+    assert ddl == [
+        "ALTER TABLE xp_events DETACH PARTITION xp_events_p202604",
+        "DROP TABLE xp_events_p202604",
+    ]
@@ -0,0 +1,247 @@
+import asyncio
+import json
+
+import msgspec
+import pytest
+
+from app.services import sse_service
+
+
+class FakePubSub:
+    def __init__(self):
+        self.channels: set[str] = set()
+
+    async def subscribe(self, *channels):
+        self.channels.update(channels)
+
+    async def unsubscribe(self, *channels):
+        self.channels.difference_update(channels)
+
+
+class FakeReplayRedis:
+    def __init__(self, entries):
+        self.entries = entries
+
+    async def xrange(self, key, min="-", max="+"):
+        return [entry for entry in self.entries if not sse_service.is_after(min, entry[0])]
+
+
+@pytest.mark.asyncio
+async def test_push_without_redis_delivers_locally():
+    q = await sse_service.connect(1)
+    try:
+        assert await sse_service.push(1, "xp_gained", {"amount": 10})
+        event = q.get_nowait()
+        assert (event.type, event.data) == ("xp_gained", {"amount": 10})
+        assert event.frame == b'event: xp_gained\ndata: {"amount": 10}\n\n'
+        assert not await sse_service.push(2, "xp_gained", {"amount": 10})
+    finally:
+        await sse_service.disconnect(1, q)
+    assert 1 not in sse_service._queues
+
+
+@pytest.mark.asyncio
+async def test_user_channel_subscribed_while_connected(monkeypatch):
+    pubsub = FakePubSub()
+    monkeypatch.setattr(sse_service, "_pubsub", pubsub)
+
+    first = await sse_service.connect(7)
+    second = await sse_service.connect(7)
+    assert pubsub.channels == {"sse:user:7"}
+
+    await sse_service.disconnect(7, first)
+    assert pubsub.channels == {"sse:user:7"}
+    await sse_service.disconnect(7, second)
+    assert pubsub.channels == set()
+    assert 7 not in sse_service._queues
+
+
+def _xp(amount: int) -> sse_service.Event:
+    return sse_service.Event("xp_gained", {"amount": amount, "count": 1, "level_up": False, "total_xp": amount})
+
+
+def test_full_queue_coalesces_xp_gained(monkeypatch):
+    monkeypatch.setattr(sse_service.settings, "SSE_OVERFLOW_POLICY", sse_service.COALESCE)
+    monkeypatch.setattr(sse_service, "overflow_counts", sse_service.Counter())
+    q = sse_service.ConnectionQueue(2)
+    shared = _xp(10)
+    for event in (sse_service.Event("goal_updated", {}), shared, _xp(20), _xp(30)):
+        assert q.offer(event)
+
+    assert q.qsize() == 2
+    q.get_nowait()
+    merged = q.get_nowait().data
+    assert (merged["amount"], merged["count"], merged["total_xp"]) == (60, 3, 30)
+    assert shared.data["amount"] == 10
+    assert sse_service.overflow_counts == {sse_service.COALESCE: 2}
+
+
+def test_full_queue_drops_oldest(monkeypatch):
+    monkeypatch.setattr(sse_service.settings, "SSE_OVERFLOW_POLICY", sse_service.DROP_OLDEST)
+    monkeypatch.setattr(sse_service, "overflow_counts", sse_service.Counter())
+    q = sse_service.ConnectionQueue(2)
+    for amount in (1, 2, 3):
+        assert q.offer(_xp(amount))
+
+    assert [q.get_nowait().data["amount"] for _ in range(2)] == [2, 3]
+    assert sse_service.overflow_counts == {sse_service.DROP_OLDEST: 1}
+
+
+def test_full_queue_disconnects_slow_consumer(monkeypatch):
+    monkeypatch.setattr(sse_service.settings, "SSE_OVERFLOW_POLICY", sse_service.DISCONNECT)
+    monkeypatch.setattr(sse_service, "overflow_counts", sse_service.Counter())
+    q = sse_service.ConnectionQueue(1)
+    assert q.offer(_xp(1))
+    assert not q.offer(_xp(2))
+    assert not q.offer(_xp(3))
+
+    assert q.get_nowait() is None
+    assert sse_service.overflow_counts == {sse_service.DISCONNECT: 1}
+
+
+@pytest.mark.asyncio
+async def test_replay_returns_events_after_last_id(monkeypatch):
+    entries = [
+        (f"1700000000000-{i}", {"type": "xp_gained", "data": json.dumps({"amount": i})})
+        for i in range(4)
+    ]
+
+    async def fake_get_redis():
+        return FakeReplayRedis(entries)
+
+    monkeypatch.setattr(sse_service, "get_redis", fake_get_redis)
+
+    events, resumed = await sse_service.replay(1, "1700000000000-1")
+    assert resumed
+    assert [(e.id, e.data["amount"]) for e in events] == [("1700000000000-2", 2), ("1700000000000-3", 3)]
+
+    # The buffer was trimmed past the client's id: replay what is left and ask for a resync
+    events, resumed = await sse_service.replay(1, "1699999999999-0")
+    assert not resumed
+    assert len(events) == 4
+
+    assert await sse_service.replay(1, "not-an-id") == ([], False)
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_only_fills_idle_streams(monkeypatch):
+    monkeypatch.setattr(sse_service, "KEEPALIVE_SECONDS", 0.01)
+    idle = await sse_service.connect(3)
+    busy = await sse_service.connect(4)
+    busy.offer(_xp(5))
+    await sse_service.start()
+    try:
+        await asyncio.sleep(0.05)
+    finally:
+        await sse_service.stop()
+        await sse_service.disconnect(3, idle)
+        await sse_service.disconnect(4, busy)
+
+    assert [idle.get_nowait()] == [sse_service.KEEPALIVE] and idle.empty()
+    assert busy.qsize() == 1 and busy.get_nowait().type == "xp_gained"
+
+
+@pytest.mark.asyncio
+async def test_connect_enforces_limits(monkeypatch):
+    monkeypatch.setattr(sse_service.settings, "SSE_MAX_CONNECTIONS_PER_USER", 2)
+    monkeypatch.setattr(sse_service.settings, "SSE_MAX_CONNECTIONS", 3)
+    monkeypatch.setattr(sse_service, "connection_counts", sse_service.Counter())
+    opened = [(1, await sse_service.connect(1)), (1, await sse_service.connect(1))]
+    try:
+        with pytest.raises(sse_service.ConnectionLimitError) as exc:
+            await sse_service.connect(1)
+        assert exc.value.scope == "user"
+
+        opened.append((2, await sse_service.connect(2)))
+        with pytest.raises(sse_service.ConnectionLimitError) as exc:
+            await sse_service.connect(3)
+        assert exc.value.scope == "process"
+        assert sse_service.stats()["connections"] == 3
+    finally:
+        for user_id, q in opened:
+            await sse_service.disconnect(user_id, q)
+
+    assert sse_service._queues == {}
+    assert sse_service.stats()["connections"] == 0
+    assert sse_service.stats()["refused"] == {"user": 1, "process": 1}
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_closes_idle_streams(monkeypatch):
+    monkeypatch.setattr(sse_service, "KEEPALIVE_SECONDS", 0.01)
+    monkeypatch.setattr(sse_service.settings, "SSE_IDLE_SECONDS", 60)
+    q = await sse_service.connect(5)
+    q.last_event_at -= 120
+    await sse_service.start()
+    try:
+        assert await asyncio.wait_for(q.get(), timeout=1) is None
+    finally:
+        await sse_service.stop()
+        await sse_service.disconnect(5, q)
+
+
+
+def test_socket_frames_are_compact_and_cached():
+    event = sse_service.Event("xp_gained", {"amount": 5}, "1700000000000-0")
+    frame = event.socket_frame("json")
+    assert frame == '{"t":"xp_gained","d":{"amount":5},"id":"1700000000000-0"}'
+    assert event.socket_frame("json") is frame
+    assert msgspec.msgpack.decode(event.socket_frame("msgpack")) == json.loads(frame)
+
+
+def test_coalesced_xp_keeps_every_event_id(monkeypatch):
+    monkeypatch.setattr(sse_service.settings, "SSE_OVERFLOW_POLICY", sse_service.COALESCE)
+    q = sse_service.ConnectionQueue(1)
+    for ids in ([1, 2], [3]):
+        q.offer(sse_service.Event("xp_gained", {"amount": 1, "event_ids": ids}))
+    assert q.get_nowait().data["event_ids"] == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_push_counts_only_streams_as_delivered():
+    stream = await sse_service.connect(8)
+    socket = await sse_service.connect(8, acks=True)
+    try:
+        assert await sse_service.push(8, "goal_updated", {})
+        await sse_service.disconnect(8, stream)
+        assert not await sse_service.push(8, "goal_updated", {})
+        assert socket.qsize() == 2
+    finally:
+        await sse_service.disconnect(8, stream)
+        await sse_service.disconnect(8, socket)
+    assert 8 not in sse_service._queues
+
+
+@pytest.mark.asyncio
+async def test_coalescing_window_merges_bursts(monkeypatch):
+    monkeypatch.setattr(sse_service.settings, "SSE_COALESCE_WINDOW_MS", 20)
+    q = await sse_service.connect(9)
+    try:
+        for amount, level in ((10, 2), (15, 3), (20, 3)):
+            await sse_service.push(9, "xp_gained", {"amount": amount, "count": 1, "level_up": level == 3, "new_level": level})
+        await sse_service.push(9, "goal_updated", {"id": 1, "current": 1, "xp_awarded": 0})
+        await sse_service.push(9, "goal_updated", {"id": 2, "current": 4})
+        await sse_service.push(9, "goal_updated", {"id": 1, "current": 2})
+        assert q.empty()
+
+        await asyncio.sleep(0.05)
+        events = [q.get_nowait() for _ in range(q.qsize())]
+    finally:
+        await sse_service.disconnect(9, q)
+
+    assert [(e.type, e.data.get("id")) for e in events] == [("xp_gained", None), ("goal_updated", 1), ("goal_updated", 2)]
+    xp = events[0].data
+    assert (xp["amount"], xp["count"], xp["level_up"], xp["new_level"]) == (45, 3, True, 3)
+    assert events[1].data == {"id": 1, "current": 2, "xp_awarded": 0}
+
+
+@pytest.mark.asyncio
+async def test_coalescing_window_flushes_before_other_events(monkeypatch):
+    monkeypatch.setattr(sse_service.settings, "SSE_COALESCE_WINDOW_MS", 1000)
+    q = await sse_service.connect(10)
+    try:
+        await sse_service.push(10, "goal_updated", {"id": 1, "current": 2})
+        await sse_service.push(10, "goal_deleted", {"id": 1})
+        assert [q.get_nowait().type for _ in range(q.qsize())] == ["goal_updated", "goal_deleted"]
+    finally:
+        await sse_service.disconnect(10, q)
@@ -43,3 +43,321 @@ async def test_webhook_ignores_non_push_events(client, monkeypatch):
     )
     assert response.status_code == 200
     assert response.json()["status"] == "ignored"
+
+
+@pytest.mark.asyncio
+async def test_webhook_queues_delivery_when_enabled(client, monkeypatch):
+    from app.core import config
+    from app.services import webhook_queue
+    monkeypatch.setattr(config.settings, "GITHUB_WEBHOOK_SECRET", "testsecret")
+    monkeypatch.setattr(config.settings, "WEBHOOK_QUEUE_ENABLED", True)
+
+    queued = []
+
+    async def fake_enqueue(event_type, delivery_id, body):
+        queued.append((event_type, delivery_id, body))
+        return "1-0"
+
+    monkeypatch.setattr(webhook_queue, "enqueue", fake_enqueue)
+
+    body = json.dumps({"commits": [], "pusher": {"name": "someone"}}).encode()
+    response = await client.post(
+        "/api/webhooks/github",
+        content=body,
+        headers={
+            "Content-Type": "application/json",
+            "X-GitHub-Event": "push",
+            "X-GitHub-Delivery": "abc-123",
+            "X-Hub-Signature-256": make_signature(body, "testsecret"),
+        },
+    )
+    assert response.status_code == 202
+    assert response.json()["status"] == "queued"
+    assert queued == [("push", "abc-123", body)]
+
+
+@pytest.mark.asyncio
+async def test_webhook_queue_dead_letters_after_max_attempts(monkeypatch):
+    from unittest.mock import AsyncMock
+    from app.core import config
+    from app.services import webhook_queue
+    monkeypatch.setattr(config.settings, "WEBHOOK_MAX_ATTEMPTS", 3)
+
+    redis = AsyncMock()
+    redis.xpending_range.return_value = [{"message_id": "1-0", "times_delivered": 3}]
+
+    async def failing(event_type, delivery_id, body):
+        raise RuntimeError("boom")
+
+    fields = {"event": "push", "delivery": "abc", "body": "{}"}
+    await webhook_queue._handle(redis, "1-0", fields, failing)
+
+    redis.xadd.assert_awaited_once()
+    assert redis.xadd.await_args.args[0] == webhook_queue.DEAD_LETTER_STREAM
+    redis.xack.assert_awaited_once_with(webhook_queue.STREAM, webhook_queue.GROUP, "1-0")
+
+
+@pytest.mark.asyncio
+async def test_webhook_redelivery_is_idempotent(client, db, monkeypatch):
+    from app.core import config
+    from app.models.user import User
+    monkeypatch.setattr(config.settings, "GITHUB_WEBHOOK_SECRET", "testsecret")
+
+    user = User(github_id="gh-1", github_login="pusher", username="pusher", xp=0, level=1, pending_level_up=False)
+    db.add(user)
+    await db.commit()
+
+    body = json.dumps({
+        "commits": [{"id": "abc", "added": ["a.py"], "removed": [], "modified": []}],
+        "repository": {"full_name": "pusher/repo"},
+        "pusher": {"name": "pusher"},
+    }).encode()
+    headers = {
+        "Content-Type": "application/json",
+        "X-GitHub-Event": "push",
+        "X-GitHub-Delivery": "delivery-1",
+        "X-Hub-Signature-256": make_signature(body, "testsecret"),
+    }
+
+    first = await client.post("/api/webhooks/github", content=body, headers=headers)
+    await db.refresh(user)
+    xp_after_first = user.xp
+
+    second = await client.post("/api/webhooks/github", content=body, headers=headers)
+    await db.refresh(user)
+
+    assert first.json() == {"status": "ok", "commits_processed": 1}
+    assert second.json() == first.json()
+    assert xp_after_first == 12
+    assert user.xp == xp_after_first
+
+
+@pytest.mark.asyncio
+async def test_delivery_claim_lives_in_the_handler_transaction(db):
+    from app.services import delivery_store
+
+    assert await delivery_store.claim(db, "delivery-2", "push") is None
+    assert await delivery_store.claim(db, "delivery-2", "push") == delivery_store.IN_PROGRESS
+
+    await db.rollback()  # the handler failed: its claim goes with its writes
+    assert await delivery_store.claim(db, "delivery-2", "push") is None
+    await delivery_store.record(db, "delivery-2", {"status": "ok", "commits_processed": 1})
+    await db.commit()
+    assert await delivery_store.claim(db, "delivery-2", "push") == {"status": "ok", "commits_processed": 1}
+
+
+@pytest.mark.asyncio
+async def test_delivery_claim_released_between_set_and_get(db, monkeypatch):
+    from unittest.mock import AsyncMock
+    from app.services import delivery_store
+
+    # SET NX loses to a claim that a failing handler releases before our GET
+    redis = AsyncMock()
+    redis.set.return_value = None
+    redis.get.return_value = None
+    monkeypatch.setattr(delivery_store, "get_redis", AsyncMock(return_value=redis))
+
+    assert await delivery_store.claim(db, "delivery-3", "push") is None
+    assert await delivery_store._get_recorded(db, "delivery-3") == delivery_store.IN_PROGRESS
+    assert await delivery_store.claim(db, "delivery-3", "push") == delivery_store.IN_PROGRESS
+
+
+@pytest.mark.asyncio
+async def test_redelivery_answered_before_parsing(db):
+    from app.api.routes.webhooks import process_delivery
+    from app.services import delivery_store
+
+    assert await delivery_store.claim(db, "delivery-4", "push") is None
+    await delivery_store.record(db, "delivery-4", {"status": "ok", "commits_processed": 3})
+    await db.commit()
+
+    # Not even valid JSON: a recorded delivery is never decoded again
+    assert await process_delivery("push", "delivery-4", b"\x00not json", db) == {"status": "ok", "commits_processed": 3}
+
+
+@pytest.mark.asyncio
+async def test_prune_deliveries_by_age(db):
+    from datetime import datetime, timedelta, timezone
+    from app.models.webhook_delivery import WebhookDelivery
+    from app.services import delivery_store
+
+    db.add_all([
+        WebhookDelivery(delivery_id="old", event="push", result={}, created_at=datetime.now(timezone.utc) - timedelta(days=4)),
+        WebhookDelivery(delivery_id="new", event="push", result={}),
+    ])
+    await db.commit()
+
+    assert await delivery_store.prune(db, timedelta(hours=72)) == 1
+    assert await delivery_store.get(db, "old") is None
+    assert await delivery_store.get(db, "new") == {}
+
+
+def test_decode_push_payload_keeps_only_used_fields():
+    from app.api.routes.webhooks import decode_payload
+
+    body = json.dumps({
+        "commits": [{
+            "id": "abc",
+            "message": "ignored",
+            "author": {"name": "x", "email": "y"},
+            "added": ["a.py", "b.py"],
+            "removed": [],
+            "modified": ["c.py"],
+        }],
+        "repository": {"full_name": "octo/repo", "owner": {"login": "octo"}},
+        "sender": {"login": "octo"},
+    }).encode()
+
+    event = decode_payload("push", body)
+    assert event.repository.full_name == "octo/repo"
+    assert event.actor_login == "octo"
+    assert event.commits[0].id == "abc"
+    assert event.commits[0].files_changed == 3
+    assert not hasattr(event.commits[0], "author")
+
+
+@pytest.mark.asyncio
+async def test_resolve_user_caches_unknown_login(db):
+    from unittest.mock import AsyncMock
+    from app.api.routes.webhooks import _resolve_user
+
+    assert await _resolve_user(db, "ghost") is None
+
+    untouched_db = AsyncMock()
+    assert await _resolve_user(untouched_db, "ghost") is None
+    untouched_db.execute.assert_not_awaited()
+    untouched_db.get.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_resolve_user_invalidated_after_signup(db):
+    from app.api.routes.webhooks import _resolve_user
+    from app.models.user import User
+    from app.services import login_cache
+
+    assert await _resolve_user(db, "newbie") is None
+
+    user = User(github_id="gh-2", github_login="newbie", username="newbie")
+    db.add(user)
+    await db.commit()
+    await login_cache.invalidate("newbie")
+
+    resolved = await _resolve_user(db, "newbie")
+    assert resolved is not None and resolved.id == user.id
+    assert await login_cache.lookup("newbie") == user.id
+
+
+class FakeLoginRedis:
+    def __init__(self):
+        self.hash: dict[str, str] = {}
+        self.keys: dict[str, int] = {}  # key -> ttl
+
+    async def hget(self, key, field):
+        return self.hash.get(field)
+
+    async def hset(self, key, field, value):
+        self.hash[field] = str(value)
+
+    async def expire(self, key, ttl, nx=False):
+        pass
+
+    async def exists(self, key):
+        return int(key in self.keys)
+
+    async def set(self, key, value, ex=None):
+        self.keys[key] = ex
+
+    async def hdel(self, key, *fields):
+        for field in fields:
+            self.hash.pop(field, None)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.keys.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return FakeLoginPipeline(self)
+
+
+class FakeLoginPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append(getattr(self.redis, name)(*args))
+
+    async def execute(self):
+        return [await call for call in self.calls]
+
+
+@pytest.mark.asyncio
+async def test_unknown_logins_expire_on_their_own(monkeypatch):
+    from app.services import login_cache
+    redis = FakeLoginRedis()
+
+    async def fake_get_redis():
+        return redis
+
+    monkeypatch.setattr(login_cache, "get_redis", fake_get_redis)
+    redis.hash["legacy"] = "0"  # a negative kept in the hash by an older release
+
+    await login_cache.store("latecomer", None)  # stored just after the signup invalidated it
+    await login_cache.store("member", 7)
+    assert redis.keys == {"github_login:unknown:latecomer": login_cache.UNKNOWN_TTL}
+    assert redis.hash == {"legacy": "0", "member": "7"}
+
+    login_cache._local.clear()
+    assert await login_cache.lookup("latecomer") == login_cache.UNKNOWN
+    assert await login_cache.lookup("member") == 7
+    assert await login_cache.lookup("legacy") is None
+
+    await login_cache.invalidate("latecomer")
+    assert redis.keys == {}
+    assert await login_cache.lookup("latecomer") is None
+
+
+@pytest.mark.asyncio
+async def test_push_stores_file_lists_out_of_line(client, db, user, auth_headers, monkeypatch):
+    from sqlalchemy import func, select
+    from app.core import config
+    from app.models.commit_files import CommitFileList
+    from app.models.xp_event import XPEvent
+    monkeypatch.setattr(config.settings, "GITHUB_WEBHOOK_SECRET", "testsecret")
+
+    same_files = {"added": [], "removed": [], "modified": ["README.md"]}
+    body = json.dumps({
+        "commits": [
+            {"id": "c1", **same_files},
+            {"id": "c2", **same_files},
+            {"id": "c3", "added": ["new.py"], "removed": ["old.py"], "modified": []},
+        ],
+        "repository": {"full_name": "testuser/repo"},
+        "pusher": {"name": "testuser"},
+    }).encode()
+    response = await client.post(
+        "/api/webhooks/github",
+        content=body,
+        headers={
+            "Content-Type": "application/json",
+            "X-GitHub-Event": "push",
+            "X-Hub-Signature-256": make_signature(body, "testsecret"),
+        },
+    )
+    assert response.json()["commits_processed"] == 3
+
+    assert (await db.execute(select(func.count()).select_from(CommitFileList))).scalar_one() == 2
+
+    result = await db.execute(select(XPEvent).where(XPEvent.user_id == user.id).order_by(XPEvent.id))
+    events = result.scalars().all()
+    assert "modified_files" not in events[2].meta
+    assert events[2].meta["files_changed"] == 2
+
+    files = await client.get(f"/api/events/{events[2].id}/files", headers=auth_headers)
+    assert files.json() == {"added": ["new.py"], "removed": ["old.py"], "modified": []}
@@ -1,10 +1,16 @@
 import pytest
 import pytest_asyncio
+from sqlalchemy import select
+
 from app.models.user import User
-from app.models.xp_event import XPSource
+from app.models.xp_event import XPEvent, XPSource
+from app.services import sse_service
 from app.services.xp_service import (
     award_xp,
+    award_xp_batch,
     compute_level,
+    relevel_users,
+    MAX_LEVEL,
     xp_for_level,
     streak_multiplier,
     GOAL_DIFFICULTY_XP,
@@ -28,6 +34,17 @@ def test_compute_level():
     assert compute_level(200) == 3
 
 
+def test_compute_level_matches_curve():
+    def reference(total_xp):
+        level = 1
+        while level < MAX_LEVEL and total_xp >= xp_for_level(level + 1):
+            level += 1
+        return level
+
+    for total_xp in list(range(0, 2000)) + [xp_for_level(MAX_LEVEL) - 1, xp_for_level(MAX_LEVEL), 10**9]:
+        assert compute_level(total_xp) == reference(total_xp)
+
+
 def test_streak_multiplier():
     assert streak_multiplier(0) == 1.0
     assert streak_multiplier(6) == 1.0
@@ -98,3 +115,273 @@ async def test_award_xp_daily_cap(db):
     awarded = await award_xp(db, user, XPSource.COMMIT)
     assert awarded == 0
     assert user.xp == xp_at_cap
+
+
+@pytest.mark.asyncio
+async def test_award_xp_batch_single_push(db, monkeypatch):
+    user = User(github_id="202", github_login="batcher", username="batcher", xp=0, level=1, pending_level_up=False)
+    db.add(user)
+    await db.flush()
+
+    pushed = []
+
+    async def fake_push(user_id, event_type, data):
+        pushed.append((event_type, data))
+        return True
+
+    monkeypatch.setattr(sse_service, "push", fake_push)
+
+    items = [(XPSource.COMMIT, {"sha": str(i), "repo": "a/b", "files_changed": i}) for i in range(3)]
+    awarded = await award_xp_batch(db, user, items, meta={"repo": "a/b", "commits": 3})
+    await db.commit()
+
+    assert awarded == [10, 12, 14]
+    assert user.xp == 36
+    assert len(pushed) == 1
+    assert pushed[0][1]["amount"] == 36
+    assert pushed[0][1]["count"] == 3
+
+    result = await db.execute(select(XPEvent).where(XPEvent.user_id == user.id))
+    events = result.scalars().all()
+    assert sorted(e.amount for e in events) == [10, 12, 14]
+    assert sorted(pushed[0][1]["event_ids"]) == sorted(e.id for e in events)
+    assert all(e.notified for e in events)
+
+
+@pytest.mark.asyncio
+async def test_award_xp_unnotified_until_acked(db, monkeypatch):
+    user = User(github_id="204", github_login="socketeer", username="socketeer", xp=0, level=1, pending_level_up=False)
+    db.add(user)
+    await db.flush()
+
+    async def fake_push(user_id, event_type, data):
+        return False  # offline, or only connected over an acking WebSocket
+
+    monkeypatch.setattr(sse_service, "push", fake_push)
+    await award_xp_batch(db, user, [(XPSource.COMMIT, {"sha": "1", "repo": "a/b", "files_changed": 1})])
+
+    result = await db.execute(select(XPEvent.notified).where(XPEvent.user_id == user.id))
+    assert result.scalars().all() == [False]
+
+
+@pytest.mark.asyncio
+async def test_xp_pushed_only_after_commit(db, monkeypatch):
+    from app.api.routes.events import _mark_notified
+
+    user = User(github_id="205", github_login="quickack", username="quickack", xp=0, level=1, pending_level_up=False)
+    db.add(user)
+    await db.flush()
+    pushed = []
+
+    async def fake_push(user_id, event_type, data):
+        assert not db.in_transaction()  # the events are committed before anyone hears of them
+        pushed.append(data["event_ids"])
+        await _mark_notified(db, user_id, data["event_ids"])  # a socket client acking immediately
+        return False
+
+    monkeypatch.setattr(sse_service, "push", fake_push)
+    item = (XPSource.COMMIT, {"sha": "1", "repo": "a/b", "files_changed": 1})
+    await award_xp_batch(db, user, [item])
+    assert pushed == []  # not yet: the award hasn't committed
+
+    await db.commit()
+    result = await db.execute(select(XPEvent.id, XPEvent.notified).where(XPEvent.user_id == user.id))
+    assert [(pushed[0][0], True)] == result.all()
+
+    await award_xp_batch(db, user, [item])
+    await db.rollback()
+    await db.commit()
+    assert len(pushed) == 1
+
+
+@pytest.mark.asyncio
+async def test_award_xp_batch_empty(db):
+    user = User(github_id="303", github_login="empty", username="empty", xp=0, level=1, pending_level_up=False)
+    db.add(user)
+    await db.flush()
+
+    assert await award_xp_batch(db, user, []) == []
+    assert user.xp == 0
+
+
+@pytest.mark.asyncio
+async def test_relevel_users(db):
+    xps = [0, xp_for_level(2), xp_for_level(7) + 5, xp_for_level(MAX_LEVEL) * 2]
+    users = [
+        User(github_id=f"rl{i}", github_login=f"rl{i}", username=f"rl{i}", xp=xp, level=1)
+        for i, xp in enumerate(xps)
+    ]
+    db.add_all(users)
+    await db.commit()
+
+    changed = await relevel_users(db, chunk_size=2)
+
+    assert sorted(changed) == [u.id for u in users[1:]]
+    result = await db.execute(select(User.xp, User.level).order_by(User.id))
+    assert [level for _, level in result.all()] == [compute_level(xp) for xp in xps]
+
+
+@pytest.mark.asyncio
+async def test_award_xp_batch_respects_daily_cap(db, monkeypatch):
+    from app.services import xp_service
+    monkeypatch.setitem(xp_service.DAILY_CAPS, XPSource.COMMIT, 3)
+
+    user = User(github_id="404", github_login="capped", username="capped", xp=0, level=1, pending_level_up=False)
+    db.add(user)
+    await db.flush()
+
+    await award_xp(db, user, XPSource.COMMIT)
+    awarded = await award_xp_batch(db, user, [(XPSource.COMMIT, None)] * 4)
+
+    assert awarded == [10, 10, 0, 0]
+    assert user.xp == 30
+
+
+class FakeCounterRedis:
+    """Just enough of Redis for the daily cap counters, including _RESERVE_DAILY's semantics."""
+
+    def __init__(self):
+        self.counts: dict[str, int] = {}
+
+    async def eval(self, script, numkeys, key, requested, seed, expires_at):
+        if key not in self.counts:
+            if seed == "":
+                return None
+            self.counts[key] = int(seed)
+        self.counts[key] += int(requested)
+        return self.counts[key]
+
+    async def decrby(self, key, amount):
+        self.counts[key] = self.counts.get(key, 0) - amount
+
+    def pipeline(self, transaction=True):
+        return FakeCounterPipeline(self)
+
+
+class FakeCounterPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def decrby(self, key, amount):
+        self.calls.append(self.redis.decrby(key, amount))
+
+    def expireat(self, key, when):
+        pass
+
+    async def execute(self):
+        return [await call for call in self.calls]
+
+
+@pytest.mark.asyncio
+async def test_daily_cap_redis_counter_seeded_and_refunded(db, monkeypatch):
+    from app.services import xp_service
+    monkeypatch.setitem(xp_service.DAILY_CAPS, XPSource.COMMIT, 3)
+    fake = FakeCounterRedis()
+
+    async def fake_get_redis():
+        return fake
+
+    user = User(github_id="406", github_login="counted", username="counted", xp=0, level=1, pending_level_up=False)
+    db.add(user)
+    await db.flush()
+    await award_xp(db, user, XPSource.COMMIT)  # awarded before the counter existed
+    await db.commit()
+
+    monkeypatch.setattr(xp_service, "get_redis", fake_get_redis)
+    assert await award_xp_batch(db, user, [(XPSource.COMMIT, None)] * 3) == [10, 10, 0]
+    [key] = fake.counts
+    assert fake.counts[key] == 3  # seeded with the earlier award
+
+    await db.rollback()  # e.g. the webhook failed; its reservation must not count
+    assert fake.counts[key] == 1
+
+    await db.refresh(user)
+    assert await award_xp_batch(db, user, [(XPSource.COMMIT, None)] * 3) == [10, 10, 0]
+    await db.commit()
+    assert fake.counts[key] == 3
+    assert await award_xp(db, user, XPSource.COMMIT) == 0
+
+
+@pytest.mark.asyncio
+async def test_award_xp_increments_in_sql(db):
+    from sqlalchemy import update
+
+    user = User(github_id="505", github_login="racer", username="racer", xp=90, level=1, pending_level_up=False)
+    db.add(user)
+    await db.commit()
+
+    # Another worker awards XP after this request loaded the user
+    await db.execute(update(User).where(User.id == user.id).values(xp=User.xp + 5))
+
+    await award_xp(db, user, XPSource.COMMIT)
+
+    assert user.xp == 105
+    assert user.level == compute_level(105)
+    assert user.pending_level_up is True
+
+
+@pytest.mark.asyncio
+async def test_award_xp_maintains_daily_rollup(db):
+    from app.models.xp_rollup import XPDailyRollup
+    from app.services import rollup_service
+
+    user = User(github_id="606", github_login="roller", username="roller", xp=0, level=1, pending_level_up=False)
+    db.add(user)
+    await db.flush()
+
+    await award_xp_batch(db, user, [(XPSource.COMMIT, None), (XPSource.COMMIT, {"files_changed": 1})])
+    await award_xp(db, user, XPSource.LEETCODE_SOLVE, meta={"difficulty": "medium"})
+    await award_xp(db, user, XPSource.COMMIT)
+    await db.commit()
+
+    user_id = user.id
+
+    async def snapshot():
+        result = await db.execute(select(XPDailyRollup).where(XPDailyRollup.user_id == user_id))
+        return sorted((r.source, r.amount, r.count) for r in result.scalars().all())
+
+    incremental = await snapshot()
+    assert incremental == [("commit", 32, 3), ("leetcode_solve", 40, 1)]
+
+    await rollup_service.rebuild(db)
+    db.expire_all()
+    assert await snapshot() == incremental
+
+
+@pytest.mark.asyncio
+async def test_rollup_rebuild_days_stays_in_range(db):
+    from datetime import date, datetime, timezone
+
+    from app.models.xp_rollup import XPDailyRollup
+    from app.services import rollup_service
+
+    user = User(github_id="607", github_login="ranger", username="ranger", xp=0, level=1, pending_level_up=False)
+    db.add(user)
+    await db.flush()
+    # An archived day with no events left, and two live days
+    db.add(XPDailyRollup(user_id=user.id, day=date(2026, 3, 31), source="commit", amount=50, count=5))
+    db.add_all([
+        XPEvent(user_id=user.id, source="commit", amount=10, created_at=datetime(2026, 4, 1, 0, 30, tzinfo=timezone.utc)),
+        XPEvent(user_id=user.id, source="commit", amount=10, created_at=datetime(2026, 4, 1, 23, 30, tzinfo=timezone.utc)),
+        XPEvent(user_id=user.id, source="commit", amount=7, created_at=datetime(2026, 5, 1, 0, 0, tzinfo=timezone.utc)),
+    ])
+    await db.commit()
+    user_id = user.id
+
+    written = await rollup_service.rebuild_days(db, date(2026, 4, 1), date(2026, 5, 1))
+    await db.commit()
+    db.expire_all()
+
+    assert written == 1
+    result = await db.execute(select(XPDailyRollup).where(XPDailyRollup.user_id == user_id))
+    assert sorted((r.day, r.amount, r.count) for r in result.scalars().all()) == [
+        (date(2026, 3, 31), 50, 5),
+        (date(2026, 4, 1), 20, 2),
+    ]